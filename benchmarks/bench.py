@@ -0,0 +1,204 @@
+"""Headless timing and memory benchmark of the dashboard.
+
+Every function in dashboard/dashboard.py is timed (inclusive wall time) and
+memory-profiled (peak traced allocation) while the app runs on synthetic
+datasets of several sizes, in these scenarios:
+
+    cold     first run of a new session, nothing cached
+    rerun    the same session rerun without changes
+    filter   the first Region selected in the sidebar
+    sections every data expander opened and the Sales vs Profit tab selected (Points scatter)
+    density  the same with the scatter plot in Density mode
+    session  a new session while the first one's dataset and charts are in the shared stores
+    restart  a new session of a new process, reading the on-disk dataset cache
+
+Results are written to benchmarks/results/<label>.json. Compare two versions with
+
+    python benchmarks/bench.py --sizes 10000 100000 1000000 --label after --compare benchmarks/results/before.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, os.path.join(ROOT, "dashboard"))
+sys.path.insert(0, HERE)
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+import data_loader
+from store import datasets
+from figures import figures
+import profiling
+from synthetic import write_dataset
+
+DATA_DIR = os.path.join(HERE, "data")
+RESULTS_DIR = os.path.join(HERE, "results")
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# Seconds a single app run may take before the benchmark gives up
+RUN_TIMEOUT = 1800
+
+# Functions faster than this are left out of comparisons, their timings are mostly noise
+MIN_COMPARE_SECONDS = 0.01
+
+def _app(dataset):
+    import profiling
+    profiling.run_dashboard(dataset)
+
+# Synthetic dataset of `rows` rows, generated on first use
+def dataset_path(rows, seed=0):
+    path = os.path.join(DATA_DIR, f"superstore-{rows}-{seed}.csv")
+    if not os.path.exists(path):
+        print(f"generating {rows:,} rows -> {path}")
+        write_dataset(path, rows, seed)
+    return path
+
+def _measure(at, scenario, rows, memory, action=None):
+    profiling.current = profiling.FunctionProfiler(memory)
+    if memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        (action or at.run)()
+    finally:
+        seconds = time.perf_counter() - started
+        if memory:
+            tracemalloc.stop()
+    if at.exception:
+        raise RuntimeError(f"{scenario} at {rows:,} rows failed: {at.exception[0].message}")
+    functions = dict(sorted(profiling.current.stats.items(), key=lambda item: -item[1]["seconds"]))
+    print(f"{rows:>12,} {scenario:<8} {seconds:8.2f}s")
+    return {"rows": rows, "scenario": scenario, "seconds": round(seconds, 4), "functions": functions}
+
+def _select_first_region(at):
+    region = at.sidebar.multiselect[0]
+    return lambda: region.set_value(region.options[:1]).run()
+
+# Widget state that opens every lazily rendered section: the data expanders and the scatter tab
+OPEN_SECTIONS = {
+    "category_view": True,
+    "region_view": True,
+    "timeseries_view": True,
+    "summary_tables": True,
+    "grid_view": True,
+    "detail_tabs": "Sales vs Profit",
+}
+
+# Expanders and tabs only keep their state while their widgets are shown, so it is set again
+# before every run
+def _open_sections(at, scatter_mode="Points"):
+    def run():
+        for key, value in dict(OPEN_SECTIONS, scatter_mode=scatter_mode).items():
+            at.session_state[key] = value
+        at.run()
+    return run
+
+# Run every scenario on a dataset of `rows` rows with an empty on-disk cache
+def bench_size(rows, memory=True, seed=0):
+    dataset = dataset_path(rows, seed)
+    results = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        data_loader.CACHE_DIR = cache_dir
+        datasets.clear()
+        figures.clear()
+        at = AppTest.from_function(_app, args=(dataset,), default_timeout=RUN_TIMEOUT)
+        results.append(_measure(at, "cold", rows, memory))
+        results.append(_measure(at, "rerun", rows, memory))
+        results.append(_measure(at, "filter", rows, memory, _select_first_region(at)))
+        results.append(_measure(at, "sections", rows, memory, _open_sections(at)))
+        results.append(_measure(at, "density", rows, memory, _open_sections(at, "Density")))
+
+        at = AppTest.from_function(_app, args=(dataset,), default_timeout=RUN_TIMEOUT)
+        results.append(_measure(at, "session", rows, memory))
+
+        datasets.clear()
+        figures.clear()
+        at = AppTest.from_function(_app, args=(dataset,), default_timeout=RUN_TIMEOUT)
+        results.append(_measure(at, "restart", rows, memory))
+    return results
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# (rows, scenario, function) pairs that got slower than `threshold` times the baseline
+def compare(baseline, results, threshold):
+    before = {(r["rows"], r["scenario"]): r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'rows':>12} {'scenario':<8} {'function':<28} {'before':>9} {'after':>9} {'ratio':>6}")
+    for run in results:
+        old = before.get((run["rows"], run["scenario"]))
+        if old is None:
+            continue
+        for name, stats in run["functions"].items():
+            previous = old["functions"].get(name)
+            if previous is None or max(previous["seconds"], stats["seconds"]) < MIN_COMPARE_SECONDS:
+                continue
+            ratio = stats["seconds"] / max(previous["seconds"], 1e-9)
+            flag = " !" if ratio > threshold else ""
+            print(f"{run['rows']:>12,} {run['scenario']:<8} {name:<28} {previous['seconds']:9.3f} "
+                  f"{stats['seconds']:9.3f} {ratio:6.2f}{flag}")
+            if flag:
+                regressions.append((run["rows"], run["scenario"], name))
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Vizolytic dashboard on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="dataset sizes in rows")
+    parser.add_argument("--label", help="name of the results file, defaults to the git revision")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic datasets")
+    parser.add_argument("--no-memory", action="store_true", help="time only, without tracemalloc overhead")
+    parser.add_argument("--compare", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio reported as a regression when comparing")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Relative paths in the app (assets, cache) resolve from the repository root
+    os.chdir(ROOT)
+    revision = _git_revision()
+    label = args.label or revision or datetime.now().strftime("%Y%m%d-%H%M%S")
+
+    results = []
+    for rows in args.sizes:
+        results.extend(bench_size(rows, memory=not args.no_memory, seed=args.seed))
+
+    report = {
+        "label": label,
+        "revision": revision,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "memory_profiled": not args.no_memory,
+        "results": results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{label}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        print(f"{len(regressions)} regression(s) above {args.threshold}x")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
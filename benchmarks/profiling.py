@@ -0,0 +1,68 @@
+import functools
+import inspect
+import os
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DASHBOARD_SCRIPT = os.path.join(ROOT, "dashboard", "dashboard.py")
+
+# Inclusive wall time and peak traced memory of every call to the wrapped functions.
+# Peaks of nested calls are carried up to their callers, so each function reports the
+# most memory allocated at once while it was running.
+class FunctionProfiler:
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.stats = {}
+        self._stack = []
+
+    def wrap(self, name, fn):
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs):
+            started = self._enter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._exit(name, started)
+        return profiled
+
+    def _enter(self):
+        frame = [0, 0]
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            frame = [current, current]
+        self._stack.append(frame)
+        return time.perf_counter()
+
+    def _exit(self, name, started):
+        elapsed = time.perf_counter() - started
+        start, peak = self._stack.pop()
+        if self.memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+        entry = self.stats.setdefault(name, {"calls": 0, "seconds": 0.0, "peak_mb": 0.0})
+        entry["calls"] += 1
+        entry["seconds"] += elapsed
+        entry["peak_mb"] = max(entry["peak_mb"], (peak - start) / 2**20)
+
+# Profiler the next dashboard run reports to, set by the benchmark before each run
+current = None
+
+# Run dashboard.py with every function it defines wrapped by the current profiler and the
+# bundled dataset replaced by `dataset`
+def run_dashboard(dataset):
+    with open(DASHBOARD_SCRIPT, encoding="utf-8") as f:
+        code = compile(f.read(), DASHBOARD_SCRIPT, "exec")
+    namespace = {"__name__": "dashboard", "__file__": DASHBOARD_SCRIPT}
+    exec(code, namespace)
+
+    namespace["open_path"] = functools.partial(namespace["open_path"], dataset)
+    for name, value in list(namespace.items()):
+        # Sections are decorated (profiled, fragments), so look at the function they wrap
+        if inspect.isfunction(value) and inspect.unwrap(value).__code__.co_filename == DASHBOARD_SCRIPT:
+            namespace[name] = current.wrap(name, value)
+    namespace["main"]()
@@ -0,0 +1,107 @@
+"""Generate a synthetic Superstore dataset of any size.
+
+The bundled sample is resampled, so the output keeps its columns, formats and
+cardinalities: the Region/State/City/Postal Code hierarchy, customers and their
+segments, products with their categories, the order date span and seasonality,
+lines per order, and the joint distribution of Sales/Quantity/Discount/Profit.
+
+    python benchmarks/synthetic.py --rows 1000000 --output benchmarks/data/superstore-1m.csv
+"""
+import argparse
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_DATASET = os.path.join(ROOT, "data", "Superstore.csv")
+CSV_ENCODING = "ISO-8859-1"
+
+# Columns taken together from one sample row, so the pairs inside each group stay consistent
+ORDER_COLUMNS = ["Ship Mode", "Customer ID", "Customer Name", "Segment", "Country", "City", "State",
+                 "Postal Code", "Region"]
+LINE_COLUMNS = ["Product ID", "Category", "Sub-Category", "Product Name", "Sales", "Quantity", "Discount",
+                "Profit"]
+
+# Rows written per chunk
+WRITE_ROWS = 500_000
+
+# Relative spread of the noise applied to Sales and Profit, so values are not just repeated
+MEASURE_NOISE = 0.05
+
+def load_sample(path=SAMPLE_DATASET):
+    sample = pd.read_csv(path, encoding=CSV_ENCODING)
+    sample["Order Date"] = pd.to_datetime(sample["Order Date"], format="%m/%d/%Y")
+    sample["Ship Date"] = pd.to_datetime(sample["Ship Date"], format="%m/%d/%Y")
+    return sample
+
+# M/D/YYYY strings like the sample, formatting each distinct date once
+def _format_dates(dates):
+    codes, uniques = pd.factorize(pd.DatetimeIndex(dates))
+    labels = np.array([f"{d.month}/{d.day}/{d.year}" for d in uniques], dtype=object)
+    return labels[codes]
+
+# A synthetic frame of `rows` order lines with the sample's schema
+def generate(rows, sample=None, seed=0, first_row_id=1):
+    sample = load_sample() if sample is None else sample
+    rng = np.random.default_rng(seed)
+
+    # Orders, with the sample's lines-per-order distribution
+    lines_per_order = sample.groupby("Order ID").size().to_numpy()
+    counts = rng.choice(lines_per_order, size=rows // max(int(lines_per_order.min()), 1) + 1)
+    counts = counts[:np.searchsorted(np.cumsum(counts), rows) + 1]
+    counts[-1] -= counts.sum() - rows
+    orders = len(counts)
+
+    # Order-level attributes come from one sample row per order
+    order_source = rng.integers(0, len(sample), size=orders)
+    order_dates = sample["Order Date"].to_numpy()[order_source]
+    ship_delay = (sample["Ship Date"] - sample["Order Date"]).to_numpy()[order_source]
+    order_ids = pd.Series(order_dates).dt.year.astype(str).to_numpy()
+    # Order numbers start from the first row id, so chunks generated separately never collide
+    numbers = np.arange(100000 + first_row_id, 100000 + first_row_id + orders)
+    order_ids = "CA-" + order_ids + "-" + pd.Series(numbers).astype(str).to_numpy()
+
+    line_order = np.repeat(np.arange(orders), counts)
+    line_source = rng.integers(0, len(sample), size=rows)
+    noise = rng.normal(1.0, MEASURE_NOISE, size=rows).clip(0.5, 1.5)
+
+    df = pd.DataFrame({"Row ID": np.arange(first_row_id, first_row_id + rows),
+                       "Order ID": order_ids[line_order],
+                       "Order Date": _format_dates(order_dates[line_order]),
+                       "Ship Date": _format_dates((order_dates + ship_delay)[line_order])})
+    for col in ORDER_COLUMNS:
+        df[col] = sample[col].to_numpy()[order_source][line_order]
+    for col in LINE_COLUMNS:
+        df[col] = sample[col].to_numpy()[line_source]
+    df["Sales"] = (df["Sales"] * noise).round(4)
+    df["Profit"] = (df["Profit"] * noise).round(4)
+    return df[sample.columns]
+
+# Write `rows` synthetic rows to a CSV file, a chunk at a time
+def write_dataset(path, rows, seed=0, sample_path=SAMPLE_DATASET):
+    sample = load_sample(sample_path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    for i, start in enumerate(range(0, rows, WRITE_ROWS)):
+        chunk = generate(min(WRITE_ROWS, rows - start), sample, seed=seed + i, first_row_id=start + 1)
+        chunk.to_csv(tmp, mode="a" if i else "w", header=i == 0, index=False, encoding=CSV_ENCODING)
+    os.replace(tmp, path)
+    return path
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic Superstore dataset.")
+    parser.add_argument("--rows", type=int, required=True, help="number of order lines")
+    parser.add_argument("--output", required=True, help="CSV file to write")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--sample", default=SAMPLE_DATASET, help="dataset to resample")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    write_dataset(args.output, args.rows, args.seed, args.sample)
+    print(f"{args.rows:,} rows written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import logging
+from cube import query_cube, cube_totals
+
+logger = logging.getLogger(__name__)
+
+# Dictionary mapping full state names to abbreviations
+us_state_abbrev = {
+    'Alabama': 'AL', 'Alaska': 'AK', 'Arizona': 'AZ', 'Arkansas': 'AR',
+    'California': 'CA', 'Colorado': 'CO', 'Connecticut': 'CT', 'Delaware': 'DE',
+    'Florida': 'FL', 'Georgia': 'GA', 'Hawaii': 'HI', 'Idaho': 'ID',
+    'Illinois': 'IL', 'Indiana': 'IN', 'Iowa': 'IA', 'Kansas': 'KS',
+    'Kentucky': 'KY', 'Louisiana': 'LA', 'Maine': 'ME', 'Maryland': 'MD',
+    'Massachusetts': 'MA', 'Michigan': 'MI', 'Minnesota': 'MN', 'Mississippi': 'MS',
+    'Missouri': 'MO', 'Montana': 'MT', 'Nebraska': 'NE', 'Nevada': 'NV',
+    'New Hampshire': 'NH', 'New Jersey': 'NJ', 'New Mexico': 'NM', 'New York': 'NY',
+    'North Carolina': 'NC', 'North Dakota': 'ND', 'Ohio': 'OH', 'Oklahoma': 'OK',
+    'Oregon': 'OR', 'Pennsylvania': 'PA', 'Rhode Island': 'RI', 'South Carolina': 'SC',
+    'South Dakota': 'SD', 'Tennessee': 'TN', 'Texas': 'TX', 'Utah': 'UT',
+    'Vermont': 'VT', 'Virginia': 'VA', 'Washington': 'WA', 'West Virginia': 'WV',
+    'Wisconsin': 'WI', 'Wyoming': 'WY'
+}
+
+# Per-rerun memo of the aggregates of the filtered cube. Every dashboard section and the
+# PDF report ask it for their group-bys, so each one is computed once and the same result
+# object is handed to all callers; treat the results as read-only.
+class AggregationService:
+    approximate = False
+
+    def __init__(self, filtered_cube, filter_key):
+        self.cube = filtered_cube
+        self.filter_key = filter_key
+        self.results = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _memo(self, key, compute):
+        key = (self.filter_key,) + key
+        if key in self.results:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.results[key] = compute()
+        return self.results[key]
+
+    # Measures summed by the given dimensions
+    def get(self, by, measures=("Sales",)):
+        by, measures = tuple(by), tuple(measures)
+        return self._memo(("group", by, measures), lambda: query_cube(self.cube, list(by), measures))
+
+    # Grand totals of the measures and the order count
+    def totals(self):
+        return self._memo(("totals",), lambda: cube_totals(self.cube))
+
+    # Sales by state with the two-letter codes used by the choropleths
+    def state_sales(self):
+        def compute():
+            state_sales = self.get(["State"]).copy()
+            # Map full state names to abbreviations
+            state_sales["State_Abbrev"] = state_sales["State"].map(us_state_abbrev)
+            # Remove any states that couldn't be mapped
+            return state_sales.dropna(subset=["State_Abbrev"])
+        return self._memo(("state_sales",), compute)
+
+    # Largest n groups by a measure
+    def top(self, by, n=5, measure="Sales"):
+        return self._memo(("top", by, n, measure),
+                          lambda: self.get([by], [measure]).nlargest(n, measure).reset_index(drop=True))
+
+    def log_stats(self):
+        logger.debug("aggregations: %d hits, %d misses", self.hits, self.misses)
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+from aggregates import AggregationService
+
+# Dimensions the sample is stratified by. The charts answered in approximate mode group by
+# these or by levels nested in them (State, City, Sub-Category), so every group is estimated
+# from the rows of a few strata.
+STRATA = ["Region", "Category", "Segment"]
+
+# Rows kept in a dataset's sample, and the fewest kept from any stratum
+APPROX_SAMPLE_ROWS = 100_000
+MIN_STRATUM_ROWS = 100
+
+# Normal quantile of the two-sided 95% confidence intervals
+Z_95 = 1.96
+
+# Group-bys of the charts answered from the sample, refined to exact results in the background
+APPROX_GROUPS = [("Category",), ("Region",), ("Segment",), ("Region", "Category", "Sub-Category"), ("State",)]
+
+# Rows to draw from each stratum of the given sizes: proportional to the stratum, at least
+# MIN_STRATUM_ROWS and at most the whole stratum
+def allocation(sizes, n=APPROX_SAMPLE_ROWS):
+    sizes = np.asarray(sizes, dtype=np.int64)
+    share = np.ceil(sizes * (n / max(sizes.sum(), 1))).astype(np.int64)
+    return np.minimum(sizes, np.maximum(share, MIN_STRATUM_ROWS))
+
+# A stratified random sample of a dataset: the sampled rows with their stratum code, and per
+# stratum the number of orders in the dataset (N) and in the sample (n)
+class StratifiedSample:
+    def __init__(self, rows, population):
+        self.rows = rows
+        self.population = population
+        self.strata = rows["Stratum"].to_numpy()
+
+    # Rows of the sample that match the selection with an order date in [start, end)
+    def _mask(self, selection):
+        rows = self.rows
+        dates = rows["Order Date"]
+        mask = ((dates >= selection.start) & (dates < selection.end)).to_numpy()
+        for level, values in selection.levels.items():
+            if values:
+                mask = mask & rows[level].isin(values).to_numpy()
+        return mask
+
+    # Estimated sums of the measures by `by` over the selection, with the half-width of their
+    # 95% confidence interval in "<measure> CI". Each stratum's rows stand for N/n orders;
+    # the variance is the stratified one, with a finite population correction.
+    def estimate(self, selection, by, measures=("Sales",)):
+        by, measures = list(by), list(measures)
+        selected = self.rows[self._mask(selection)]
+        values = selected[measures].astype(np.float64)
+        squares = values.pow(2).add_suffix(" sq")
+        keys = [selected[col] for col in by] + [selected["Stratum"]]
+        sums = pd.concat([values, squares], axis=1).groupby(keys, observed=True, sort=False).sum()
+
+        stratum = sums.index.get_level_values("Stratum")
+        N = self.population["N"].to_numpy(dtype=np.float64)[stratum]
+        n = self.population["n"].to_numpy(dtype=np.float64)[stratum]
+        parts = {}
+        for m in measures:
+            total, square = sums[m].to_numpy(), sums[f"{m} sq"].to_numpy()
+            # Rows of the stratum outside the group count as zeros in its sample variance
+            variance = np.where(n > 1, (square - total ** 2 / n) / np.maximum(n - 1, 1), 0.0)
+            parts[m] = N / n * total
+            parts[f"{m} var"] = N ** 2 * (1 - n / N) * np.maximum(variance, 0.0) / n
+        estimates = pd.DataFrame(parts, index=sums.index)
+        if by:
+            estimates = estimates.groupby(level=by, observed=True, sort=True).sum().reset_index()
+        else:
+            estimates = estimates.sum().to_frame().T
+        for m in measures:
+            estimates[f"{m} CI"] = Z_95 * np.sqrt(estimates.pop(f"{m} var"))
+        for col in by:
+            if isinstance(estimates[col].dtype, pd.CategoricalDtype):
+                estimates[col] = estimates[col].astype(estimates[col].cat.categories.dtype)
+        return estimates
+
+# Aggregation service answering group-bys from a dataset's sample. Results carry "<measure> CI"
+# columns, which the charts draw as error bars or show on hover.
+class ApproximateAggregationService(AggregationService):
+    approximate = True
+
+    def __init__(self, sample, selection):
+        super().__init__(None, selection.key)
+        self.sample = sample
+        self.selection = selection
+
+    def get(self, by, measures=("Sales",)):
+        by, measures = tuple(by), tuple(measures)
+        return self._memo(("group", by, measures), lambda: self.sample.estimate(self.selection, by, measures))
+
+    def totals(self):
+        return self._memo(("totals",), lambda: self.sample.estimate(self.selection, (), ("Sales", "Profit", "Quantity")).iloc[0])
+
+# Background job computing the exact aggregates of the approximate charts; returns the service
+def refine(aggregates, progress):
+    for i, by in enumerate(APPROX_GROUPS):
+        progress(i / len(APPROX_GROUPS), "Refining")
+        aggregates.get(by)
+    aggregates.state_sales()
+    progress(1.0, "Done")
+    return aggregates
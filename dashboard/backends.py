@@ -0,0 +1,140 @@
+import os
+import streamlit as st
+import data_loader
+from data_loader import DEFAULT_DATASET, derived, file_kind, load_path, load_uploaded, path_digest, remeasure, spool_upload
+from cube import build_cube, append_cube
+from filters import DatasetFilter
+from grid import GridIndex
+from rollups import TimeRollups
+from aggregates import AggregationService
+from sampling import stratified_sample, density_grid
+from schema import memory_bytes
+from exports import serialize
+import duckdb_backend
+
+# Query engine: "pandas" keeps every dataset in memory, "duckdb" queries CSV files from disk,
+# "auto" switches to DuckDB for CSV files of OUT_OF_CORE_MB and more
+BACKEND = os.environ.get("VIZOLYTIC_BACKEND", "auto")
+OUT_OF_CORE_MB = float(os.environ.get("VIZOLYTIC_OUT_OF_CORE_MB", "1024"))
+
+SCATTER_MEASURES = ["Sales", "Profit", "Quantity"]
+
+# Whether a file of this size and kind is queried out of core
+def use_out_of_core(size, kind):
+    if kind != "csv" or BACKEND == "pandas" or not duckdb_backend.available():
+        return False
+    return BACKEND == "duckdb" or size >= OUT_OF_CORE_MB * 2**20
+
+# Sidebar selection and the order dates [start, end) a rerun is filtered by
+class Selection:
+    def __init__(self, levels, start, end):
+        self.levels = levels
+        self.start = start
+        self.end = end
+        self.key = tuple(tuple(levels[level]) for level in levels) + (start, end)
+
+# A dataset held in memory: the cube and indexes are built once per dataset (carried over
+# on appends) and the row positions of a selection are computed once per rerun
+class PandasDataset:
+    in_memory = True
+
+    def __init__(self, df, digest):
+        self.df = df
+        self.digest = digest
+        self.orders = len(df)
+        self.cube = None
+        self.filter = None
+        self.rollups = None
+        self._positions = (None, None)
+
+    def prepare(self):
+        df = self.df
+        self.cube = derived(self.digest, "cube", lambda: build_cube(df),
+                            lambda previous, append: append_cube(previous, append["delta"]))
+        cube = self.cube
+        self.filter = derived(self.digest, "filter", lambda: DatasetFilter(df, cube),
+                              lambda previous, append: previous.extend(df, cube, append))
+        self.rollups = derived(self.digest, "rollups", lambda: TimeRollups(df),
+                               lambda previous, append: previous.extend(append))
+        return self
+
+    def columns(self):
+        return list(self.df.columns)
+
+    def date_range(self):
+        return self.filter.date_range()
+
+    def options(self, level, selection=None):
+        return self.filter.options(level, selection)
+
+    def aggregates(self, selection):
+        filtered_cube = self.filter.filter_cube(selection.levels, selection.start, selection.end)
+        return AggregationService(filtered_cube, selection.key)
+
+    # Measures per period for the selection with a date in [start, end)
+    def rollup(self, selection, start, end, granularity):
+        return self.rollups.slice(selection.levels, start, end, granularity)
+
+    def positions(self, selection):
+        if self._positions[0] != selection.key:
+            self._positions = (selection.key,
+                               self.filter.row_positions(selection.levels, selection.start, selection.end))
+        return self._positions[1]
+
+    def rows(self, selection):
+        return self.filter.take_rows(self.positions(selection))
+
+    def count(self, selection):
+        return GridIndex.count(self.positions(selection))
+
+    # First n orders, optionally in [start, end)
+    def head(self, n=5, start=None, end=None):
+        if start is None:
+            return self.df.head(n)
+        return self.filter.filter_rows({}, start, end)[:n]
+
+    def page(self, selection, columns, sort_by=None, ascending=True, page=1, page_size=25):
+        grid = derived(self.digest, "grid", lambda: GridIndex(self.filter.df, lambda: remeasure(self.digest)))
+        return grid.page(self.positions(selection), selection.key, columns, sort_by, ascending, page, page_size)
+
+    # Sample per Category with the extreme Sales/Profit orders kept
+    def scatter_sample(self, selection, n):
+        rows = self.rows(selection).dropna(subset=SCATTER_MEASURES)
+        if len(rows) <= n:
+            return rows, len(rows)
+        return stratified_sample(rows, n, "Category", outlier_columns=["Sales", "Profit"]), len(rows)
+
+    def scatter_density(self, selection, bins=80):
+        rows = self.rows(selection).dropna(subset=SCATTER_MEASURES)
+        x, y, counts = density_grid(rows["Sales"].to_numpy(), rows["Profit"].to_numpy(), bins)
+        return x, y, counts, len(rows)
+
+    # Export of the orders in [start, end): a frame builder and its serializer
+    def export(self, start, end):
+        return (lambda: self.filter.filter_rows({}, start, end)), serialize
+
+    def memory_caption(self):
+        size = memory_bytes(self.df)
+        raw = self.df.attrs.get("raw_bytes")
+        if raw:
+            return f"{self.orders:,} orders in {size / 2**20:,.1f} MB ({raw / 2**20:,.1f} MB before compaction)"
+        return f"{self.orders:,} orders in {size / 2**20:,.1f} MB"
+
+def _open_out_of_core(path, digest):
+    with st.spinner("Loading the file into DuckDB..."):
+        return duckdb_backend.open_dataset(path, digest, data_loader.CACHE_DIR)
+
+# Dataset of a file on disk
+def open_path(path=DEFAULT_DATASET):
+    if use_out_of_core(os.path.getsize(path), file_kind(path)):
+        return _open_out_of_core(path, path_digest(path, duckdb_backend.known_digests(data_loader.CACHE_DIR)))
+    df, digest = load_path(path)
+    return PandasDataset(df, digest)
+
+# Dataset of an uploaded file
+def open_upload(fl):
+    if use_out_of_core(fl.size, file_kind(fl.name)):
+        path, digest = spool_upload(fl)
+        return _open_out_of_core(path, digest)
+    df, digest = load_uploaded(fl)
+    return PandasDataset(df, digest)
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+from schema import concat_frames
+
+# Dimensions the cube is grouped by, "Month" is the order month (first day of the month)
+CUBE_DIMENSIONS = ["Region", "State", "City", "Category", "Sub-Category", "Segment", "Month"]
+CUBE_MEASURES = ["Sales", "Profit", "Quantity"]
+
+# Pre-aggregate the order rows once per dataset; "Orders" counts the rows in each cell
+def build_cube(df):
+    month = df["Order Date"].dt.to_period("M").dt.to_timestamp().rename("Month")
+    keys = [df[col] for col in CUBE_DIMENSIONS[:-1]] + [month]
+    # Downcast float measures are summed in float64 so totals keep their precision
+    measures = df[CUBE_MEASURES].astype({col: np.float64 for col in CUBE_MEASURES
+                                         if pd.api.types.is_float_dtype(df[col].dtype)})
+    grouped = measures.groupby(keys, dropna=False, sort=False, observed=True)
+    cube = grouped[CUBE_MEASURES].sum()
+    cube["Orders"] = grouped.size()
+    # Sorted by month so a date range is a contiguous block of cells
+    return cube.reset_index().sort_values("Month", kind="stable", ignore_index=True)
+
+# Cube after `delta` rows were appended to its dataset: the delta's cells are added to the
+# existing ones, so the cost depends on the number of cells and the delta, not on the history
+def append_cube(cube, delta):
+    combined = concat_frames([cube, build_cube(delta)], ignore_index=True)
+    grouped = combined.groupby(CUBE_DIMENSIONS, dropna=False, sort=False, observed=True)
+    cube = grouped[CUBE_MEASURES + ["Orders"]].sum().reset_index()
+    return cube.sort_values("Month", kind="stable", ignore_index=True)
+
+# Roll the cube cells up to the given dimensions. The small result gets plain value
+# columns, since charting libraries do not all handle categoricals.
+def query_cube(cube, by, measures=("Sales",)):
+    result = cube.groupby(by, as_index=False, observed=True, sort=True)[list(measures)].sum()
+    for col in by:
+        if isinstance(result[col].dtype, pd.CategoricalDtype):
+            result[col] = result[col].astype(result[col].cat.categories.dtype)
+    return result
+
+# Grand totals of the measures and the order count
+def cube_totals(cube):
+    return cube[CUBE_MEASURES + ["Orders"]].sum()
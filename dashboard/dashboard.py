@@ -4,19 +4,31 @@ import pandas as pd
 import warnings
 import base64
 import plotly.figure_factory as ff
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.pdfgen import canvas
+import plotly.graph_objects as go
+import numpy as np
 import matplotlib.pyplot as plt
-import io
+from data_loader import FILE_TYPES, append_upload
+from backends import Selection, PandasDataset, open_path, open_upload
+from grid import PAGE_SIZES
+from exports import EXPORT_FORMATS, deferred_export, serialize
+from debug import profiled, fragment, section, start_rerun, finish_rerun, count_aggregates
+from memo import memoized
+from rollups import GRANULARITIES, ROLLUP_MEASURES, time_series
+from report import build_report
+from jobs import submit_job
+from approximate import refine
+from figures import cached_figure, chart_key
 
 warnings.filterwarnings('ignore')
 
+# Above this many orders the scatter plot is drawn with WebGL from a sample
+SCATTER_MAX_POINTS = 20_000
+
+# Moving average windows offered on the time series, in periods (0 is off)
+MOVING_AVERAGE_WINDOWS = [0, 3, 6, 12]
+
 # create the page title
+@profiled
 def page_title():
     LOGO_IMAGE = "assets/icon1.png"
     st.markdown(
@@ -48,9 +60,7 @@ def page_title():
         unsafe_allow_html=True
     )
 
-    # Convert image to base64
-    with open(LOGO_IMAGE, "rb") as img_file:
-        encoded = base64.b64encode(img_file.read()).decode()
+    encoded = encoded_logo(LOGO_IMAGE)
 
     st.markdown(
         f"""
@@ -62,538 +72,519 @@ def page_title():
         unsafe_allow_html=True
     )
 
+# Logo as base64, read and encoded once per server process
+@st.cache_resource(show_spinner=False)
+def encoded_logo(path):
+    with open(path, "rb") as img_file:
+        return base64.b64encode(img_file.read()).decode()
+
 # upload file
+@profiled
 def uploaded_file():
-    fl = st.file_uploader("📁 Upload your CSV file.", type=["csv", "txt", "xlsx", "xls"])
+    fl = st.file_uploader("📁 Upload your CSV file.", type=list(FILE_TYPES))
     if fl is not None:
         filename = fl.name
-        df = pd.read_csv(filename, encoding="ISO-8859-1")
+        dataset = open_upload(fl)
         st.success(f"✅ {filename} uploaded successfully!!")
         st.write("📄 Data Preview")
-        st.write(df.head())
+        st.write(dataset.head())
     else:
-        df = pd.read_csv("data/Superstore.csv", encoding="ISO-8859-1")
-
-    return df
+        dataset = open_path()
+
+    # New orders from a delta file are appended to a dataset held in memory
+    if dataset.in_memory:
+        delta = st.file_uploader("➕ Append new orders (same columns)", type=list(FILE_TYPES), key="delta_upload")
+        if delta is not None:
+            rows = dataset.orders
+            try:
+                dataset = PandasDataset(*append_upload(dataset.digest, delta))
+                st.success(f"✅ {dataset.orders - rows:,} orders appended from {delta.name}")
+            except LookupError as error:
+                st.error(f"⚠️ Could not append {delta.name}: {error}. Upload it again.")
+
+    st.caption(dataset.memory_caption())
+    return dataset
 
 # Create Side Bar
-def create_sidebar(df):
+@profiled
+def create_sidebar(dataset, start, end):
     st.sidebar.header("Select Your Filter:")
+    selection = {}
 
-    # Region filtering
-    region = st.sidebar.multiselect("Select the Region", sorted(df["Region"].unique()))
-    if not region:
-        df2 = df.copy()
-    else:
-        df2 = df[df["Region"].isin(region)]
+    # Region filtering, the dependent option lists come from the precomputed hierarchy
+    selection["Region"] = st.sidebar.multiselect("Select the Region", dataset.options("Region"))
 
     # State filtering
-    state = st.sidebar.multiselect("Select the State", sorted(df2["State"].unique()))
-    if not state:
-        df3 = df2.copy()
-    else:
-        df3 = df2[df2["State"].isin(state)]
+    selection["State"] = st.sidebar.multiselect("Select the State", dataset.options("State", selection))
 
     # City filtering
-    city = st.sidebar.multiselect("Select the City", sorted(df3["City"].unique()))
-
-    # filter data based on Region, State, and City
-    if not region and not state and not city:
-        filtered_df = df
-    elif not state and not city:
-        filtered_df = df[df["Region"].isin(region)]
-    elif not region and not city:
-        filtered_df = df[df["State"].isin(state)]
-    elif state and city:
-        filtered_df = df3[df["State"].isin(state) & df3["City"].isin(city)]
-    elif region and city:
-        filtered_df = df3[df["Region"].isin(region) & df3["City"].isin(city)]
-    elif region and state:
-        filtered_df = df3[df["Region"].isin(region) & df3["State"].isin(state)]
-    elif city:
-        filtered_df = df3[df3["City"].isin(city)]
-    else:
-        filtered_df = df3[df3["Region"].isin(region) & df3["State"].isin(state) & df3["City"].isin(city)]
+    selection["City"] = st.sidebar.multiselect("Select the City", dataset.options("City", selection))
+
+    # filter data based on Region, State, City and the date range
+    selection = Selection(selection, start, end)
+
+    # Aggregates of the selection, shared by every section and the report
+    return selection, dataset.aggregates(selection)
+
+# Plotly chart, timed separately from its section in debug mode since serializing
+# the figure is often the slow part
+def plotly_chart(fig, **kwargs):
+    with section("plotly_chart"):
+        st.plotly_chart(fig, **kwargs)
 
-    # filter Categories column
-    category_df = filtered_df.groupby(by=["Category"], as_index=False)["Sales"].sum()
+# Chart of the current view (dataset digest, selection, approximate or exact) from the
+# shared figure cache; build() only runs when no session has drawn it yet
+def cached_chart(chart, view, build, **kwargs):
+    with section("figure"):
+        fig = cached_figure(chart_key(chart, *view), build)
+    plotly_chart(fig, **kwargs)
 
-    return filtered_df, category_df
+# Hover fields of a chart with, for approximate results, the 95% confidence interval of Sales
+def sales_hover(frame, fields=None):
+    fields = dict(fields or {})
+    if "Sales CI" in frame.columns:
+        fields["Sales CI"] = ":,.2f"
+    return fields
+
+CI_LABELS = {"Sales CI": "Sales ± (95% CI)"}
 
 # create bar chart for the category data
-def create_barchart(category_df):
+@profiled
+def create_barchart(aggregates, view):
     st.subheader("Category Wise Sales")
-    fig = px.bar(category_df, x="Category", y="Sales", 
-                 text=[f"${x:,.2f}" for x in category_df["Sales"]],
-                 template="seaborn"
-                 )
-    fig.update_layout(height=400)
-    st.plotly_chart(fig, config={"responsive": True})
+    def figure():
+        category_df = aggregates.get(["Category"])
+        approximate = "Sales CI" in category_df.columns
+        fig = px.bar(category_df, x="Category", y="Sales", 
+                     text=[f"{'≈' if approximate else ''}${x:,.2f}" for x in category_df["Sales"]],
+                     error_y="Sales CI" if approximate else None,
+                     labels=CI_LABELS,
+                     template="seaborn"
+                     )
+        fig.update_layout(height=400)
+        return fig
+    cached_chart("category_bar", view, figure, config={"responsive": True})
 
 # create pie chart for the region data
-def create_piechart(filtered_df):
+@profiled
+def create_piechart(aggregates, view):
     st.subheader("Region Wise Sales")
-    fig = px.pie(filtered_df, values="Sales",names="Region", hole=0)
-    fig.update_traces(text=filtered_df["Region"], textposition="outside")
-    fig.update_layout(height=400)
-    st.plotly_chart(fig, config={"responsive": True})
+    def figure():
+        region = aggregates.get(["Region"])
+        fig = px.pie(region, values="Sales",names="Region", hole=0, hover_data=sales_hover(region), labels=CI_LABELS)
+        fig.update_traces(text=region["Region"], textposition="outside")
+        fig.update_layout(height=400)
+        return fig
+    cached_chart("region_pie", view, figure, config={"responsive": True})
+
+# Expander that tracks whether it is open, so its content is only computed while someone
+# looks at it; opening or closing it reruns the app
+def lazy_expander(label, key):
+    return st.expander(label, key=key, on_change="rerun")
+
+# Download button in the chosen format; the file is only serialized when it is clicked,
+# and kept per (dataset, filter state) so downloading it again is free
+def export_button(label, build, name, key, widget_key, serializer=serialize):
+    fmt = st.selectbox("Format", list(EXPORT_FORMATS), key=f"{widget_key}_format")
+    extension, mime = EXPORT_FORMATS[fmt]
+    st.download_button(label, data=deferred_export(build, fmt, key, serializer), file_name=f"{name}.{extension}",
+                       mime=mime, key=widget_key, on_click="ignore",
+                       help="Click here to download the data")
 
 # Category view/download data
-def category_view_data(filtered_df, category_df):
+@fragment
+def category_view_data(aggregates, digest):
     cl1, cl2 = st.columns(2)
     with cl1:
-        with st.expander("Category View Data"):
-            st.write(category_df.style.background_gradient(cmap="Blues"))
-            csv = category_df.to_csv(index=False).encode('utf-8')
-            st.download_button("Download Data", data=csv, file_name="Category.csv", mime="text/csv",
-                               help="Click here to download the data as a csv file")
+        expander = lazy_expander("Category View Data", "category_view")
+        with expander:
+            if expander.open:
+                category_df = aggregates.get(["Category"])
+                st.write(category_df.style.background_gradient(cmap="Blues"))
+                export_button("Download Data", lambda: category_df, "Category",
+                              (digest, "category", aggregates.filter_key), "category_download")
     with cl2:
-        with st.expander("Region View Data"):
-            region = filtered_df.groupby(by="Region", as_index=False)["Sales"].sum()
-            st.write(region.style.background_gradient(cmap="Blues"))
-            csv = region.to_csv(index=False).encode('utf-8')
-            st.download_button("Download Data", data=csv, file_name="Region.csv", mime="text/csv",
-                               help="Click here to download the data as a csv file")
+        expander = lazy_expander("Region View Data", "region_view")
+        with expander:
+            if expander.open:
+                region = aggregates.get(["Region"])
+                st.write(region.style.background_gradient(cmap="Blues"))
+                export_button("Download Data", lambda: region, "Region",
+                              (digest, "region", aggregates.filter_key), "region_download")
     
 # Time series analysis
-def time_series_analysis(filtered_df):
-    # Ensure Order Date is datetime
-    filtered_df["Order Date"] = pd.to_datetime(filtered_df["Order Date"], errors="coerce")
-
+@fragment
+def time_series_analysis(dataset, selection):
     st.subheader('Time Series Analysis')
 
-    filtered_df["month_year"] = filtered_df["Order Date"].dt.to_period("M")
-    line_chart = filtered_df.groupby("month_year")["Sales"].sum().reset_index()
-    line_chart["month_year_str"] = line_chart["month_year"].dt.strftime("%Y - %b")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        granularity = st.selectbox("Granularity", list(GRANULARITIES), index=2, key="ts_granularity")
+    with col2:
+        measure = st.radio("Measure", ROLLUP_MEASURES, horizontal=True, key="ts_measure")
+    with col3:
+        window = st.selectbox("Moving average", MOVING_AVERAGE_WINDOWS, key="ts_window",
+                              format_func=lambda n: f"{n} periods" if n else "Off")
+    with col4:
+        compare = st.toggle("Compare with a year earlier", key="ts_yoy")
+
+    # Sliced from the dataset's rollups, so switching granularity or adding a moving
+    # average never scans the order rows
+    series = memoized(("timeseries", dataset.digest, selection.key, granularity, window),
+                      lambda: time_series(lambda start, end, g: dataset.rollup(selection, start, end, g),
+                                          selection.start, selection.end, granularity, window))
+    lines = [measure]
+    if window:
+        lines.append(f"{measure} moving average")
+    if compare:
+        lines.append(f"{measure} a year earlier")
 
     fig = px.line(
-        line_chart,
-        x="month_year_str",
-        y="Sales",
-        labels={"Sales": "Amount"},
+        series.reset_index(),
+        x="Period",
+        y=lines,
+        labels={"value": "Amount", "variable": ""},
         height=500,
         width=1000,
         template="gridon"
     )
-    st.plotly_chart(fig, config={"responsive": True})
-    time_series_view_data(line_chart)
+    plotly_chart(fig, config={"responsive": True})
+    time_series_view_data(series, (dataset.digest, "timeseries", selection.key, granularity, window))
 
 # Time series data download
-def time_series_view_data(line_chart):
-    with st.expander("View Data Time Series"):
-        export_df = line_chart[["month_year", "Sales"]]
-        st.write(export_df.T.style.background_gradient(cmap="Blues"))
-        csv = export_df.sort_values(by="month_year", ascending=True).to_csv(index=False).encode('utf-8')
-        st.download_button("Download Data", data=csv, file_name="Timeseries.csv", mime="text/csv",
-                               help="Click here to download the data as a csv file")
+@profiled
+def time_series_view_data(series, export_key):
+    expander = lazy_expander("View Data Time Series", "timeseries_view")
+    with expander:
+        if not expander.open:
+            return
+        st.write(series.style.background_gradient(cmap="Blues", subset=ROLLUP_MEASURES).format(precision=2))
+        export_button("Download Data",
+                      lambda: series.reset_index().assign(Period=lambda d: d["Period"].dt.strftime("%Y-%m-%d")),
+                      "Timeseries", export_key, "timeseries_download")
 
 # Create tree map based on Region, category, sub-categories
-def treemap_view(filtered_df):
+@profiled
+def treemap_view(aggregates, view):
     st.subheader("hierarchical view of Sales using TreeMap")
-    fig = px.treemap(filtered_df, path=["Region", "Category", "Sub-Category"], values="Sales",
-                     hover_data=["Sales"], color="Sub-Category", 
-                     color_discrete_sequence=px.colors.qualitative.Plotly)
-    fig.update_layout(width=800, height=650)
-    st.plotly_chart(fig, use_container_width=True)
+    def figure():
+        tree = aggregates.get(["Region", "Category", "Sub-Category"])
+        fig = px.treemap(tree, path=["Region", "Category", "Sub-Category"], values="Sales",
+                         hover_data=sales_hover(tree, {"Sales": True}), labels=CI_LABELS, color="Sub-Category", 
+                         color_discrete_sequence=px.colors.qualitative.Plotly)
+        fig.update_layout(width=800, height=650)
+        return fig
+    cached_chart("treemap", view, figure, use_container_width=True)
 
 # Create the chart for the segment wise sales
-def segmants_wise_data(filtered_df):
+@profiled
+def segmants_wise_data(aggregates, view):
     st.subheader("Segments Wise Sales")
-    fig = px.pie(filtered_df, values="Sales", names="Segment", template="plotly_dark")
-    fig.update_traces(text=filtered_df["Segment"], textposition="inside")
-    st.plotly_chart(fig, use_container_width=True)
+    def figure():
+        segment = aggregates.get(["Segment"])
+        fig = px.pie(segment, values="Sales", names="Segment", template="plotly_dark",
+                     hover_data=sales_hover(segment), labels=CI_LABELS)
+        fig.update_traces(text=segment["Segment"], textposition="inside")
+        return fig
+    cached_chart("segment_pie", view, figure, use_container_width=True)
 
 # Create the chart for the sales wise data
-def category_wise_data(filtered_df):
+@profiled
+def category_wise_data(aggregates, view):
     st.subheader("Category Wise Sales")
-    fig = px.pie(filtered_df, values="Sales", names="Category", template="gridon")
-    fig.update_traces(text=filtered_df["Category"], textposition="inside")
-    st.plotly_chart(fig, use_container_width=True)
+    def figure():
+        category_df = aggregates.get(["Category"])
+        fig = px.pie(category_df, values="Sales", names="Category", template="gridon",
+                     hover_data=sales_hover(category_df), labels=CI_LABELS)
+        fig.update_traces(text=category_df["Category"], textposition="inside")
+        return fig
+    cached_chart("category_pie", view, figure, use_container_width=True)
 
 # Figure factory
-def figure_factory_data(df, filtered_df):
+@fragment
+def figure_factory_data(dataset, selection, aggregates):
     st.subheader(":point_right: Month wise Sub-Category Sales Summary")
-    with st.expander("Summary Tables"):
-        df_sample = df[0:5][["Region", "State", "City", "Category", "Sales", "Profit", "Quantity"]]
+    expander = lazy_expander("Summary Tables", "summary_tables")
+    with expander:
+        if not expander.open:
+            return
+        df_sample, sub_category_year = memoized(("summary", dataset.digest, selection.key),
+                                                lambda: summary_tables(dataset, selection, aggregates))
         fig = ff.create_table(df_sample, colorscale="tropic")
-        st.plotly_chart(fig, use_container_width=True)
+        plotly_chart(fig, use_container_width=True)
 
         st.markdown("Month wise Sub-Category Table")
-        filtered_df["month"] = filtered_df["Order Date"].dt.month_name()
-        sub_category_year = pd.pivot_table(data=filtered_df, values="Sales", index=["Sub-Category"],
-                                           columns="month")
         st.write(sub_category_year.style.background_gradient(cmap="Blues"))
 
+# First orders of the date range and the average sale per order by sub-category and month
+def summary_tables(dataset, selection, aggregates):
+    df_sample = dataset.head(5, selection.start, selection.end)[["Region", "State", "City", "Category", "Sales", "Profit", "Quantity"]]
+    # Average sale per order, from the cube's per-cell sums and order counts
+    monthly = aggregates.get(["Sub-Category", "Month"], ["Sales", "Orders"])
+    month = monthly["Month"].dt.month_name().rename("month")
+    sums = monthly.groupby(["Sub-Category", month])[["Sales", "Orders"]].sum()
+    return df_sample, (sums["Sales"] / sums["Orders"]).unstack("month")
+
 # Create Scatter plot
-def create_scatter_plot(filtered_df):
-    for col in ["Sales", "Profit", "Quantity"]:
-        filtered_df[col] = pd.to_numeric(filtered_df[col], errors="coerce")
-    filtered_df = filtered_df.dropna(subset=["Sales", "Profit", "Quantity"])
-
-    fig = px.scatter(
-        filtered_df,
-        x="Sales",
-        y="Profit",
-        size="Quantity",
-        title="Relationship between Sales and Profits using Scatter Plot"
-    )
-    
+@profiled
+def create_scatter_plot(dataset, selection):
+    # Orders with missing measures are left out by the dataset
+    title = "Relationship between Sales and Profits using Scatter Plot"
+
+    mode = st.radio("Scatter mode", ["Points", "Density"], horizontal=True, key="scatter_mode")
+    if mode == "Density":
+        # Sales vs Profit binned on the server, only the grid is sent to the browser
+        x, y, counts, total = memoized(("scatter_density", dataset.digest, selection.key),
+                                       lambda: dataset.scatter_density(selection))
+        fig = go.Figure(go.Heatmap(x=x, y=y, z=np.where(counts > 0, counts, np.nan),
+                                   colorscale="Blues", colorbar=dict(title="Orders")))
+        caption = f"Density of all {total:,} orders"
+    else:
+        points, total = memoized(("scatter_sample", dataset.digest, selection.key),
+                                 lambda: dataset.scatter_sample(selection, SCATTER_MAX_POINTS))
+        if total > len(points):
+            # Sample with the extreme Sales/Profit orders kept, drawn with WebGL
+            fig = px.scatter(points, x="Sales", y="Profit", size="Quantity", render_mode="webgl")
+            caption = f"Showing a sample of {len(points):,} of {total:,} orders (outliers kept)"
+        else:
+            fig = px.scatter(
+                points,
+                x="Sales",
+                y="Profit",
+                size="Quantity",
+                title=title
+            )
+            caption = f"Showing all {total:,} orders"
+
     fig.update_layout(
-        title=dict(text="Relationship between Sales and Profits using Scatter Plot", font=dict(size=20)),
+        title=dict(text=title, font=dict(size=20)),
         xaxis_title="Sales",
         yaxis_title="Profit",
         height=500,
         width=900
     )
     
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart(fig, use_container_width=True)
+    st.caption(caption)
 
 # View the data
-def view_data(filtered_df):
-    with st.expander("View All Data"):
-        st.write(filtered_df.iloc[:500,1:20:2].style.background_gradient(cmap="Oranges"))
+@fragment
+def view_data(dataset, selection):
+    expander = lazy_expander("View All Data", "grid_view")
+    with expander:
+        if not expander.open:
+            return
+        columns = dataset.columns()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            shown = st.multiselect("Columns", columns, default=columns, key="grid_columns") or columns
+        with col2:
+            sort_by = st.selectbox("Sort by", ["Order Date (default)"] + columns, key="grid_sort")
+            sort_by = None if sort_by == "Order Date (default)" else sort_by
+        with col3:
+            ascending = st.radio("Order", ["Ascending", "Descending"], horizontal=True, key="grid_order") == "Ascending"
+            page_size = st.selectbox("Rows per page", PAGE_SIZES, key="grid_page_size")
+        total = dataset.count(selection)
+        pages = max((total - 1) // page_size + 1, 1)
+        with col4:
+            page = st.number_input("Page", min_value=1, max_value=pages, value=1, key="grid_page")
+
+        # Only the visible page is fetched and styled
+        page_df = dataset.page(selection, shown, sort_by, ascending, page, page_size)
+        st.write(page_df.style.background_gradient(cmap="Oranges").format(precision=2))
+        first = (page - 1) * page_size
+        st.caption(f"Rows {min(first + 1, total):,}–{min(first + page_size, total):,} of {total:,} (page {page} of {pages:,})")
 
 # Showing the heat map
-# Dictionary mapping full state names to abbreviations
-us_state_abbrev = {
-    'Alabama': 'AL', 'Alaska': 'AK', 'Arizona': 'AZ', 'Arkansas': 'AR',
-    'California': 'CA', 'Colorado': 'CO', 'Connecticut': 'CT', 'Delaware': 'DE',
-    'Florida': 'FL', 'Georgia': 'GA', 'Hawaii': 'HI', 'Idaho': 'ID',
-    'Illinois': 'IL', 'Indiana': 'IN', 'Iowa': 'IA', 'Kansas': 'KS',
-    'Kentucky': 'KY', 'Louisiana': 'LA', 'Maine': 'ME', 'Maryland': 'MD',
-    'Massachusetts': 'MA', 'Michigan': 'MI', 'Minnesota': 'MN', 'Mississippi': 'MS',
-    'Missouri': 'MO', 'Montana': 'MT', 'Nebraska': 'NE', 'Nevada': 'NV',
-    'New Hampshire': 'NH', 'New Jersey': 'NJ', 'New Mexico': 'NM', 'New York': 'NY',
-    'North Carolina': 'NC', 'North Dakota': 'ND', 'Ohio': 'OH', 'Oklahoma': 'OK',
-    'Oregon': 'OR', 'Pennsylvania': 'PA', 'Rhode Island': 'RI', 'South Carolina': 'SC',
-    'South Dakota': 'SD', 'Tennessee': 'TN', 'Texas': 'TX', 'Utah': 'UT',
-    'Vermont': 'VT', 'Virginia': 'VA', 'Washington': 'WA', 'West Virginia': 'WV',
-    'Wisconsin': 'WI', 'Wyoming': 'WY'
-}
-
-def heat_map(filtered_df):
+@profiled
+def heat_map(aggregates, view):
     st.subheader("Sales in the U.S. by State")
 
-    # Aggregate sales by state
-    state_sales = filtered_df.groupby("State", as_index=False)["Sales"].sum()
-
-    # Map full state names to abbreviations
-    state_sales["State_Abbrev"] = state_sales["State"].map(us_state_abbrev)
-
-    # Remove any states that couldn't be mapped
-    state_sales = state_sales.dropna(subset=["State_Abbrev"])
-
-    # Create choropleth
-    fig = px.choropleth(
-        state_sales,
-        locations="State_Abbrev",
-        locationmode="USA-states",
-        color="Sales",
-        hover_name="State",
-        hover_data={"Sales": True, "State_Abbrev": False},  # show state name and sales
-        color_continuous_scale="Blues",
-        range_color=(0, state_sales["Sales"].max()),
-        scope="usa",
-        labels={"Sales": "Total Sales"}
-    )
-
-    fig.update_layout(
-        template='plotly_white',
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        margin=dict(l=0, r=0, t=0, b=0),
-        height=500,
-        title=dict(text="State-wise Sales in the U.S.", font=dict(size=20))
-    )
-
-    st.plotly_chart(fig, use_container_width=True)
-
-# Download original dataset
-def download_dataset(df):
-    csv = df.to_csv(index=False).encode('utf-8')
-    st.download_button("Download Data Set in CSV file", data = csv, file_name="Data.csv", mime="text/csv")
-
-# PDF report header
-def report_header(story, styles):
-    icon = Image("assets/icon1.png", width=50, height=50)
-    title = Paragraph("<b>Vizolytic – Sales Dashboard Report</b>", styles["Title"])
-
-    # Create a small table to align icon and title horizontally and tightly
-    table = Table(
-        [[icon, title]],
-        colWidths=[10, 400],  # Adjust width as needed
-        hAlign='CENTER'
-    )
-
-    # Add style to reduce space between icon and title
-    table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-    ]))
-
-    story.append(table)
-    story.append(Spacer(1, 10))
-
-def add_footer(c: canvas.Canvas, doc):
-    width, height = letter
-    footer_text = "Created by Vizolytic"
-    c.setFont("Helvetica-Oblique", 9)
-    c.setFillColor(colors.grey)
-    c.drawCentredString(width / 2.0, 15, footer_text)
-
-# generate the report and export as pdf
-def generate_analytic_report(filtered_df, category_df):
-    # Create the download button in sidebar
-    st.sidebar.subheader("📄 Export Report")
-
-    if st.sidebar.button("Generate PDF Report"):
-        if filtered_df is None or category_df is None:
-            st.warning("⚠️ Please apply filters before generating the report.")
-            return
-
-        # Create a BytesIO buffer for the PDF
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
-
-        # Report Title 
-        report_header(story, styles)
-
-        # --- Summary Section ---
-        total_sales = filtered_df["Sales"].sum()
-        tolal_profit = filtered_df["Profit"].sum()
-        percent_profit = (tolal_profit/(total_sales-tolal_profit) * 100)
-        total_orders = len(filtered_df)
-
-        summary_text = f"""
-        <b>Total Sales:</b> ${total_sales:,.2f}<br/>
-        <b>Total Profit:</b> ${tolal_profit:,.2f} ({percent_profit:,.2f}%)<br/>
-        <b>Total Orders:</b> {total_orders}<br/>
-        """
-        story.append(Paragraph(summary_text, styles["BodyText"]))
-        story.append(Spacer(1, 10))
-
-        # --- Plotly Bar Chart (same color & format as dashboard) ---
-        fig_bar = px.bar(
-            category_df,
-            x="Category",
-            y="Sales",
-            text=[f"${x:,.2f}" for x in category_df["Sales"]],
-            template="seaborn",
-            color="Category",
-            color_discrete_sequence=["#4c72b0"]
-        )
-        fig_bar.update_layout(
-            title="Category Wise Sales",
-            xaxis_title="Category",
-            yaxis_title="Sales",
-            height=400,
-            width=600,
-            font=dict(size=12),
-            showlegend=False
-        )
-
-        # Save Plotly bar chart to image buffer
-        bar_buf = io.BytesIO()
-        fig_bar.write_image(bar_buf, format="png")
-        bar_buf.seek(0)
-        story.append(Image(bar_buf, width=400, height=250))
-        story.append(Spacer(1, 10))
-
-        # --- Plotly Pie Chart (same color & format) ---
-        region_sales = filtered_df.groupby("Region")["Sales"].sum().reset_index()
-        # Define custom color map
-        region_colors = {
-            "West": "#0d63c7",    # Dark Blue
-            "East": "#73bdf1",    # Light Blue
-            "Central": "#f04747", # Red
-            "South": "#f7b6b2"    # Light Pink
-        }
-
-        # Create pie chart with color map
-        fig_pie = px.pie(
-            region_sales,
-            values="Sales",
-            names="Region",
-            hole=0,
-            color="Region",
-            color_discrete_map=region_colors,
-        )
-
-        fig_pie.update_traces(
-            textposition="outside",
-            textinfo="label+percent",
-            textfont_size=12
-        )
-
-        fig_pie.update_layout(
-            title="Region Wise Sales",
-            height=400,
-            width=600,
-            font=dict(size=12),
-            legend_title_text="Region"
-        )
-
-        # Save Plotly pie chart to image buffer
-        pie_buf = io.BytesIO()
-        fig_pie.write_image(pie_buf, format="png")
-        pie_buf.seek(0)
-        story.append(Image(pie_buf, width=380, height=250))
-        story.append(Spacer(1, 10))
-
-        # --- U.S. Sales Heatmap ---
-        state_sales = filtered_df.groupby("State", as_index=False)["Sales"].sum()
-
-        # Map full state names to abbreviations
-        state_sales["State_Abbrev"] = state_sales["State"].map(us_state_abbrev)
+    def figure():
+        # Sales by state, mapped to the state abbreviations
+        state_sales = aggregates.state_sales()
 
-        # Remove any states that couldn't be mapped
-        state_sales = state_sales.dropna(subset=["State_Abbrev"])
-
-        fig_map = px.choropleth(
+        # Create choropleth
+        fig = px.choropleth(
             state_sales,
             locations="State_Abbrev",
             locationmode="USA-states",
             color="Sales",
             hover_name="State",
-            hover_data={"Sales": True, "State_Abbrev": False},
+            hover_data=sales_hover(state_sales, {"Sales": True, "State_Abbrev": False}),  # show state name and sales
             color_continuous_scale="Blues",
             range_color=(0, state_sales["Sales"].max()),
             scope="usa",
-            labels={"Sales": "Total Sales"}
+            labels={"Sales": "Total Sales", **CI_LABELS}
         )
 
-        fig_map.update_layout(
+        fig.update_layout(
             template='plotly_white',
             plot_bgcolor='white',
             paper_bgcolor='white',
-            margin=dict(l=0, r=0, t=30, b=0),
+            margin=dict(l=0, r=0, t=0, b=0),
             height=500,
-            width=900,
-            title=dict(
-                text="State-wise Sales in the U.S.",
-                font=dict(size=20, color="#333"),
-                x=0.5  # center the title
-            )
+            title=dict(text="State-wise Sales in the U.S.", font=dict(size=20))
         )
+        return fig
 
-        # --- Save Choropleth Map to Image Buffer for PDF ---
-        map_buf = io.BytesIO()
-        fig_map.write_image(map_buf, format="png")
-        map_buf.seek(0)
-
-        # --- Add to PDF Story ---
-        story.append(Image(map_buf, width=500, height=300))
-        story.append(Spacer(1, 25))
+    cached_chart("state_map", view, figure, use_container_width=True)
 
-        # --- Top 5 States and Top 5 Cities Table ---
-        top_states = filtered_df.groupby("State")["Sales"].sum().nlargest(5).reset_index()
-        top_cities = filtered_df.groupby("City")["Sales"].sum().nlargest(5).reset_index()
-
-        # Create a centered style based on Heading3
-        centered_heading = ParagraphStyle(
-            name="CenteredHeading",
-            parent=styles["Heading3"],
-            alignment=TA_CENTER
-        )
+# Download original dataset
+@fragment
+def download_dataset(dataset, start, end):
+    build, serializer = dataset.export(start, end)
+    export_button("Download Data Set", build, "Data", (dataset.digest, "dataset", start, end),
+                  "dataset_download", serializer)
+
+# generate the report in the background and export as pdf
+@fragment
+def generate_analytic_report(aggregates):
+    # Create the download button in sidebar
+    st.sidebar.subheader("📄 Export Report")
 
-        # Table title (centered)
-        story.append(Paragraph("<b>Top 5 States and Top 5 Cities by Sales</b>", centered_heading))
-        story.append(Spacer(1, 5))
-
-        # Prepare table data with headers
-        table_data = [["Top 5 States", "Sales", "Top 5 Cities", "Sales"]]
-
-        # Fill table rows (use zip_longest to handle uneven lengths)
-        from itertools import zip_longest
-        for state_row, city_row in zip_longest(top_states.itertuples(), top_cities.itertuples(), fillvalue=None):
-            state_name = state_row.State if state_row else ""
-            state_sales = f"${state_row.Sales:,.2f}" if state_row else ""
-            city_name = city_row.City if city_row else ""
-            city_sales = f"${city_row.Sales:,.2f}" if city_row else ""
-            table_data.append([state_name, state_sales, city_name, city_sales])
-
-        # Create ReportLab Table
-        tbl = Table(table_data, colWidths=[100, 80, 100, 80])
-        tbl.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.grey),       # Header background
-            ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),  # Header text color
-            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0,0), (-1,0), 8),
-            
-            # Alternate column colors: State columns beige, City columns light blue
-            ('BACKGROUND', (0,1), (1,-1), colors.beige),
-            ('BACKGROUND', (2,1), (3,-1), colors.lightblue),
-            
-            ('GRID', (0,0), (-1,-1), 1, colors.black),
-        ]))
-
-        story.append(tbl)
-        story.append(Spacer(1, 10))
-
-        # --- Build PDF ---
-        doc.build(
-            story,
-            onFirstPage=add_footer,
-            onLaterPages=add_footer
-        )
-        buffer.seek(0)
-
-        # Download button
-        st.sidebar.download_button(
-            label="📥 Download PDF",
-            data=buffer,
-            file_name="Vizolytic_Report.pdf",
-            mime="application/pdf"
-        )
+    if st.sidebar.button("Generate PDF Report"):
+        if aggregates is None:
+            st.warning("⚠️ Please apply filters before generating the report.")
+            return
+        # Build on the worker pool, the job handle survives reruns in the session
+        st.session_state["report_job"] = submit_job(build_report, aggregates)
+
+    with st.sidebar:
+        report_status()
+
+# Progress of the report job, polled every second while it is running
+def report_status():
+    job = st.session_state.get("report_job")
+    if job is None:
+        return
+    if job.done():
+        _report_result(job)
+    else:
+        st.fragment(_report_progress, run_every=1)()
+
+def _report_progress():
+    job = st.session_state.get("report_job")
+    if job is None:
+        return
+    if job.done():
+        # Full rerun so the page stops polling and shows the result
+        st.rerun()
+    st.progress(job.progress, text=job.status)
+
+def _report_result(job):
+    if job.error() is not None:
+        st.error(f"⚠️ Report generation failed: {job.error()}")
+        return
+    # Download button
+    st.download_button(
+        label="📥 Download PDF",
+        data=job.result(),
+        file_name="Vizolytic_Report.pdf",
+        mime="application/pdf",
+        on_click="ignore"
+    )
 
-# Data visualization
-def viz_data(df):
-    # Create Side Bar to filler the data
-    filtered_df, category_df = create_sidebar(df)
+# Aggregates the charts are drawn from. In approximate mode they are estimated from the
+# dataset's sample while the exact ones are computed in the background for this selection;
+# those replace the estimates once ready. Only offered for datasets queried from disk: in
+# memory the cube answers the charts as fast as the sample would.
+def chart_aggregates(dataset, selection, aggregates):
+    if dataset.in_memory or not st.sidebar.toggle("Approximate mode", key="approximate",
+                             help="Draw the charts from a sample of the orders first and refine them to exact values in the background"):
+        return aggregates
+    key = (dataset.digest, selection.key)
+    refining = st.session_state.get("refine_job")
+    if refining is None or refining[0] != key:
+        refining = (key, submit_job(refine, aggregates))
+        st.session_state["refine_job"] = refining
+    job = refining[1]
+    if job.done():
+        # A failed refinement is final for this selection: the charts fall back to exact values
+        if job.error() is not None:
+            st.error(f"⚠️ Refining the approximate charts failed: {job.error()}")
+            return aggregates
+        return job.result()
+    # Polled only while the job runs; it reruns the page once it is done
+    st.fragment(_refine_progress, run_every=1)()
+    return dataset.approximate(selection)
+
+def _refine_progress():
+    refining = st.session_state.get("refine_job")
+    if refining is None:
+        return
+    if refining[1].done():
+        # Full rerun so the charts are drawn from the exact aggregates
+        st.rerun()
+    st.caption("≈ Charts estimated from a sample of the orders (hover for 95% confidence intervals), refining to exact values…")
+
+# State map and scatter plot in tabs, only the selected one is computed
+@fragment
+def detail_tabs(dataset, selection, aggregates, view):
+    map_tab, scatter_tab = st.tabs(["Sales by State", "Sales vs Profit"], key="detail_tabs", on_change="rerun")
+    with map_tab:
+        if map_tab.open:
+            heat_map(aggregates, view)
+    with scatter_tab:
+        if scatter_tab.open:
+            create_scatter_plot(dataset, selection)
+
+# Data visualization. The page is split in fragments that only depend on their arguments:
+# the dates and sidebar filters rerun this function (selection -> aggregates -> charts) but
+# not the title and upload, and a widget inside a section below reruns just that section.
+@fragment
+def viz_data(dataset):
+    # In memory, the cube and indexes are built once per dataset and every chart is answered
+    # from them; after an append only the new rows are aggregated and indexed
+    with section("indexes", dataset.orders):
+        dataset.prepare()
+    digest = dataset.digest
 
     col1, col2 = st.columns(2)
-    df["Order Date"] = pd.to_datetime(df["Order Date"])
     # Getting min and max date
-    start_date = pd.to_datetime(df["Order Date"]).min()
-    end_date = pd.to_datetime(df["Order Date"]).max()
+    start_date, end_date = dataset.date_range()
 
     with col1:
         date1 = pd.to_datetime(st.date_input("Start Date", start_date))
-        create_barchart(category_df)
     with col2:
         date2 = pd.to_datetime(st.date_input("End Date", end_date))
-        create_piechart(filtered_df)
+    # The End Date is inclusive
+    date_end = date2 + pd.Timedelta(days=1)
+
+    # Create Side Bar to filler the data
+    selection, aggregates = create_sidebar(dataset, date1, date_end)
+    # The PDF report, tables and downloads always use the exact aggregates
+    charts = chart_aggregates(dataset, selection, aggregates)
+    # Charts of the same view are drawn from the figure cache shared by every session
+    view = (digest, selection.key, charts.approximate)
+
+    with col1:
+        create_barchart(charts, view)
+    with col2:
+        create_piechart(charts, view)
 
-    df = df[(df["Order Date"] >= date1) & (df["Order Date"] <= date2)].copy()
-    
     # Download the data available
-    category_view_data(filtered_df, category_df)
+    category_view_data(aggregates, digest)
 
     # Time series analysis
-    time_series_analysis(filtered_df)
+    time_series_analysis(dataset, selection)
 
     # TreeMap based on Region, category, sub-categories
-    treemap_view(filtered_df)
+    treemap_view(charts, view)
 
     chart1, chart2 = st.columns((2))
     with chart1:
-        segmants_wise_data(filtered_df)
+        segmants_wise_data(charts, view)
     with chart2:
-        category_wise_data(filtered_df)
+        category_wise_data(charts, view)
 
-    figure_factory_data(df, filtered_df)
-    create_scatter_plot(filtered_df)
-    heat_map(filtered_df)
-    generate_analytic_report(filtered_df, category_df)
-    view_data(filtered_df)
-    download_dataset(df)
-    return df
+    figure_factory_data(dataset, selection, aggregates)
+    detail_tabs(dataset, selection, charts, view)
+    generate_analytic_report(aggregates)
+    view_data(dataset, selection)
+    download_dataset(dataset, date1, date_end)
+    aggregates.log_stats()
+    count_aggregates(aggregates, charts)
 
 def main():
     st.set_page_config(
@@ -603,14 +594,20 @@ def main():
         initial_sidebar_state="expanded"
     )
 
+    # Profile the sections of this rerun in debug mode
+    start_rerun()
+
     # Create the page title
     page_title()
 
     # Uoload file
-    df = uploaded_file()
+    dataset = uploaded_file()
 
     # Data visualization
-    viz_data(df)
+    viz_data(dataset)
+
+    # Sidebar panel and log line of the rerun in debug mode
+    finish_rerun()
 
 if __name__== "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,383 @@
+import contextlib
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import streamlit as st
+from schema import categorize, compact, concat_frames, memory_bytes
+from store import datasets
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # the on-disk cache is skipped without pyarrow
+    feather = None
+
+try:
+    import openpyxl
+except ImportError:  # Excel uploads need openpyxl
+    openpyxl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASET = "data/Superstore.csv"
+CSV_ENCODING = "ISO-8859-1"
+
+# Shared on-disk cache, several server processes can point at the same directory
+CACHE_DIR = os.environ.get("VIZOLYTIC_CACHE_DIR", ".cache/vizolytic")
+
+# Bump when the cached layout changes so old cache files are not reused
+CACHE_VERSION = 6
+
+# Only the columns the dashboard reads are materialized
+DIMENSION_COLUMNS = ["Region", "State", "City", "Category", "Sub-Category", "Segment"]
+MEASURE_COLUMNS = ["Sales", "Profit", "Quantity"]
+DATE_COLUMNS = ["Order Date"]
+DASHBOARD_COLUMNS = DIMENSION_COLUMNS + MEASURE_COLUMNS + DATE_COLUMNS
+
+# Rows parsed per chunk while ingesting
+CHUNK_ROWS = 200_000
+
+# Parser used for each accepted upload type
+FILE_TYPES = {"csv": "csv", "txt": "csv", "xlsx": "excel"}
+
+# Bytes at the end of a loaded file that must be unchanged for a bigger file to count as an append
+TAIL_BYTES = 1 << 16
+
+# Parse dates and coerce measures so the rest of the dashboard gets typed columns
+def prepare_types(df):
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    for col in MEASURE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+# Parser for a file name, based on its extension
+def file_kind(name):
+    return FILE_TYPES.get(os.path.splitext(name)[1].lstrip(".").lower(), "csv")
+
+# Stream a CSV/TXT file in chunks, keeping only the dashboard columns
+def _read_csv_chunks(source, size):
+    reader = pd.read_csv(source, encoding=CSV_ENCODING, chunksize=CHUNK_ROWS,
+                         usecols=lambda col: col in DASHBOARD_COLUMNS)
+    for chunk in reader:
+        yield chunk, (source.tell() / size if size else 1.0)
+
+# Stream the first worksheet of an xlsx file row by row, keeping only the dashboard columns
+def _read_excel_chunks(source, size):
+    if openpyxl is None:
+        raise ImportError("openpyxl is required to read Excel files")
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        total_rows = sheet.max_row or 0
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        keep = [i for i, col in enumerate(header) if col in DASHBOARD_COLUMNS]
+        columns = [header[i] for i in keep]
+        block = []
+        done = 1
+        for row in rows:
+            block.append([row[i] for i in keep])
+            if len(block) == CHUNK_ROWS:
+                done += len(block)
+                yield pd.DataFrame(block, columns=columns), (done / total_rows if total_rows else 0.0)
+                block = []
+        if block:
+            yield pd.DataFrame(block, columns=columns), 1.0
+    finally:
+        workbook.close()
+
+# Read a binary file object chunk by chunk into a typed, compact DataFrame. The size the
+# columns would have had with default types is kept in df.attrs["raw_bytes"].
+def ingest(source, kind="csv", size=0, progress=None):
+    read_chunks = _read_excel_chunks if kind == "excel" else _read_csv_chunks
+    chunks = []
+    raw_bytes = 0
+    for chunk, fraction in read_chunks(source, size):
+        chunk = prepare_types(chunk)
+        raw_bytes += memory_bytes(chunk)
+        chunks.append(categorize(chunk))
+        if progress is not None:
+            progress(min(fraction, 1.0))
+    if not chunks:
+        return pd.DataFrame(columns=DASHBOARD_COLUMNS)
+    # Rows are kept in Order Date order so date ranges can be found by binary search
+    df = compact(concat_frames(chunks, ignore_index=True))
+    df = df.sort_values("Order Date", kind="stable", ignore_index=True)
+    df.attrs["raw_bytes"] = raw_bytes
+    logger.info("ingested %d rows: %.1f MB, %.1f MB with default types", len(df),
+                memory_bytes(df) / 2**20, raw_bytes / 2**20)
+    return df
+
+# Ingest with a progress bar shown while the chunks come in
+def parse_dataset(source, kind, size):
+    bar = st.progress(0.0, text="Loading data...")
+    try:
+        return ingest(source, kind, size,
+                      progress=lambda fraction: bar.progress(fraction, text="Loading data..."))
+    finally:
+        bar.empty()
+
+# Write to a temporary file first so readers never see a partial file
+def _atomic_write(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _feather_path(digest):
+    return os.path.join(CACHE_DIR, f"{digest}-v{CACHE_VERSION}.feather")
+
+# Memory-map a previously ingested dataset, None when it isn't on disk yet
+def read_disk_cache(digest):
+    path = _feather_path(digest)
+    if feather is None or not os.path.exists(path):
+        return None
+    try:
+        table = feather.read_table(path, memory_map=True)
+    except Exception:
+        return None
+    return table.to_pandas(split_blocks=True)
+
+# Store the typed dataset uncompressed so it can be memory-mapped on later loads.
+# Returns whether it was written.
+def write_disk_cache(digest, df):
+    if feather is None:
+        return False
+    try:
+        _atomic_write(_feather_path(digest),
+                      lambda tmp: feather.write_feather(df.reset_index(drop=True), tmp,
+                                                        compression="uncompressed"))
+    except OSError:
+        return False
+    return True
+
+# Appended datasets are written to the disk cache one at a time, in the order they were
+# appended, so a late write never brings back a copy that was already superseded
+_append_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="append-writer")
+
+# Write an appended dataset to the disk cache, then remove the copy it supersedes: the file of
+# the dataset it was appended to, when that one was itself produced by an append (a dataset
+# loaded from a file keeps its copy, its source file and path signature still refer to it)
+def _write_appended(digest, df, superseded=None):
+    if write_disk_cache(digest, df) and superseded is not None:
+        try:
+            os.remove(_feather_path(superseded))
+        except OSError:
+            pass
+
+# Digest of a file on disk from a previous run, keyed by path, size and mtime
+def _signature_path(path, stat):
+    key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return os.path.join(CACHE_DIR, "index", hashlib.sha256(key.encode()).hexdigest())
+
+def _read_signature(path, stat):
+    try:
+        with open(_signature_path(path, stat)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def _write_signature(path, stat, digest):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            f.write(digest)
+    try:
+        _atomic_write(_signature_path(path, stat), write)
+    except OSError:
+        pass
+
+# Return the dataset for this digest: the process-wide store, then disk, then ingest the source.
+# Sessions loading the same file at the same time share one load.
+def load_dataset(digest, open_source, kind, size):
+    def load():
+        df = read_disk_cache(digest)
+        if df is None:
+            with open_source() as source:
+                df = parse_dataset(source, kind, size)
+            write_disk_cache(digest, df)
+        return df
+    return datasets.load(digest, load)
+
+# A dataset known to be in the store; one evicted meanwhile is read back from the disk cache.
+# Raises LookupError when it is in neither.
+def _dataset(digest):
+    df = datasets.get(digest)
+    if df is None:
+        df = datasets.load(digest, lambda: read_disk_cache(digest))
+    if df is None:
+        raise LookupError(f"dataset {digest[:12]} is no longer in memory or in the disk cache")
+    return df
+
+# Structures built from a dataset (cube, indexes...), shared alongside it. When the dataset
+# was produced by appending rows to another one, update(previous, append) is used to carry
+# the previous dataset's structure forward instead of building it again.
+def derived(digest, name, build, update=None):
+    return datasets.derived(digest, name, build, update)
+
+# Count a derived structure's growth (a grid keeping a new sort order) against the store's budget
+def remeasure(digest):
+    datasets.remeasure(digest)
+
+# Add new order rows to a dataset, keeping it in Order Date order.
+# Returns the merged rows and whether the existing rows kept their positions.
+def append_rows(df, delta):
+    in_order = True
+    if len(df) and len(delta):
+        last, first_new = df["Order Date"].iloc[-1], delta["Order Date"].iloc[0]
+        in_order = pd.notna(last) and (pd.isna(first_new) or first_new >= last)
+    merged = concat_frames([df, delta], ignore_index=True)
+    if not in_order:
+        merged = merged.sort_values("Order Date", kind="stable", ignore_index=True)
+    merged.attrs["raw_bytes"] = df.attrs.get("raw_bytes", 0) + delta.attrs.get("raw_bytes", 0)
+    return merged, in_order
+
+# Register `delta` appended to the dataset `digest` and return the merged dataset's digest.
+# The merged digest chains the previous digest with the hash of the new bytes.
+def append_dataset(digest, delta, delta_digest):
+    new_digest = hashlib.sha256(f"{digest}+{delta_digest}".encode()).hexdigest()
+    if new_digest in datasets:
+        return new_digest
+    merged, in_order = append_rows(_dataset(digest), delta)
+    datasets.put(new_digest, merged, {"digest": digest, "delta": delta, "in_order": in_order,
+                                      "size": len(merged) - len(delta)})
+    # The on-disk copy is rewritten in the background so the refresh only pays for the delta;
+    # only the dataset loaded from a file and the latest append stay on disk
+    superseded = digest if datasets.append_of(digest) is not None else None
+    _append_writer.submit(_write_appended, new_digest, merged, superseded)
+    return new_digest
+
+# Append the rows of an uploaded delta file (same columns) to the dataset `digest`
+def append_upload(digest, fl):
+    applied = st.session_state.setdefault("applied_deltas", {})
+    key = (digest, fl.file_id)
+    if applied.get(key) not in datasets:
+        fl.seek(0)
+        delta = ingest(fl, file_kind(fl.name), fl.size)
+        applied[key] = append_dataset(digest, delta, _digest_stream(fl))
+    return _dataset(applied[key]), applied[key]
+
+# Load an uploaded file and return it with its digest, remembered per upload so reruns skip hashing
+def load_uploaded(fl):
+    digest = upload_digest(fl)
+
+    def open_source():
+        fl.seek(0)
+        return contextlib.nullcontext(fl)
+    return load_dataset(digest, open_source, file_kind(fl.name), fl.size), digest
+
+# Digest of an uploaded file, hashed once per upload
+def upload_digest(fl):
+    digests = st.session_state.setdefault("upload_digests", {})
+    if fl.file_id not in digests:
+        digests[fl.file_id] = _digest_stream(fl)
+    return digests[fl.file_id]
+
+# Copy an uploaded file to the cache directory, for engines that read files from disk
+def spool_upload(fl):
+    digest = upload_digest(fl)
+    path = os.path.join(CACHE_DIR, "uploads", f"{digest}.{fl.name.rsplit('.', 1)[-1].lower()}")
+    if not os.path.exists(path):
+        def write(tmp_path):
+            fl.seek(0)
+            with open(tmp_path, "wb") as out:
+                for block in iter(lambda: fl.read(1 << 20), b""):
+                    out.write(block)
+            fl.seek(0)
+        _atomic_write(path, write)
+    return path, digest
+
+# Hash a file object in blocks so the whole file is never copied
+def _digest_stream(source, block_size=1 << 20):
+    source.seek(0)
+    h = hashlib.sha256()
+    for block in iter(lambda: source.read(block_size), b""):
+        h.update(block)
+    source.seek(0)
+    return h.hexdigest()
+
+# Digest of a file on disk, re-hashing only when its size or modification time changes
+def path_digest(path, known=()):
+    stat = os.stat(path)
+    digest = _read_signature(path, stat)
+    if digest is None or not (digest in known or os.path.exists(_feather_path(digest))):
+        with open(path, "rb") as f:
+            digest = _digest_stream(f)
+        _write_signature(path, stat, digest)
+    return digest
+
+# What is needed to recognise an append to a file loaded earlier: its size, header line and a hash of its last bytes
+def _file_state(path, digest, size):
+    with open(path, "rb") as f:
+        header = f.readline()
+        start = max(size - TAIL_BYTES, 0)
+        f.seek(start)
+        tail = f.read(size - start)
+    return {"digest": digest, "size": size, "mtime": os.stat(path).st_mtime_ns, "header": header,
+            "tail": hashlib.sha256(tail).hexdigest(), "complete": tail.endswith(b"\n")}
+
+# Complete lines added to the end of a file since `state`, None when the file changed otherwise
+def _appended_bytes(path, state):
+    if not state["complete"] or os.path.getsize(path) <= state["size"]:
+        return None
+    with open(path, "rb") as f:
+        start = max(state["size"] - TAIL_BYTES, 0)
+        f.seek(start)
+        if hashlib.sha256(f.read(state["size"] - start)).hexdigest() != state["tail"]:
+            return None
+        data = f.read()
+    # A line still being written is picked up on the next refresh
+    return data[:data.rfind(b"\n") + 1] or None
+
+# Load a file from disk and return it with its digest. When the file only grew since this
+# session last loaded it, just the new lines are parsed and appended to the cached dataset.
+def load_path(path=DEFAULT_DATASET):
+    states = st.session_state.setdefault("path_states", {})
+    state = states.get(os.path.abspath(path))
+    if state is not None and state["digest"] in datasets:
+        try:
+            stat = os.stat(path)
+            if (stat.st_size, stat.st_mtime_ns) == (state["size"], state["mtime"]):
+                return _dataset(state["digest"]), state["digest"]
+            data = _appended_bytes(path, state) if file_kind(path) == "csv" else None
+            if data is not None:
+                delta = ingest(io.BytesIO(state["header"] + data), "csv", len(state["header"]) + len(data))
+                digest = append_dataset(state["digest"], delta, hashlib.sha256(data).hexdigest())
+                state = states[os.path.abspath(path)] = _file_state(path, digest, state["size"] + len(data))
+                if state["size"] == os.path.getsize(path):
+                    _write_signature(path, os.stat(path), digest)
+                return _dataset(digest), digest
+        except LookupError:
+            # Dropped from the store meanwhile and not on disk: the whole file is loaded again
+            pass
+
+    size = os.path.getsize(path)
+    digest = path_digest(path, datasets)
+    df = load_dataset(digest, lambda: open(path, "rb"), file_kind(path), size)
+    if state is None or state["digest"] != digest:
+        states[os.path.abspath(path)] = _file_state(path, digest, size)
+    return df, digest
+
+# Load a file from disk without Streamlit (batch jobs): memory-map it from the disk cache,
+# ingesting and caching it first when needed. Returns the dataset and its digest.
+def read_path(path=DEFAULT_DATASET):
+    digest = path_digest(path)
+    df = read_disk_cache(digest)
+    if df is None:
+        with open(path, "rb") as source:
+            df = ingest(source, file_kind(path), os.path.getsize(path))
+        write_disk_cache(digest, df)
+    return df, digest
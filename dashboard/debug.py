@@ -0,0 +1,226 @@
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import weakref
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from store import datasets
+from figures import figures
+
+logger = logging.getLogger("vizolytic.profile")
+
+# Debug mode is on for every session with VIZOLYTIC_DEBUG=1, or for one session with ?debug=1
+DEBUG_ENV = "VIZOLYTIC_DEBUG"
+
+# Per-rerun JSON lines go to this file when set, to stderr otherwise
+LOG_PATH_ENV = "VIZOLYTIC_PROFILE_LOG"
+
+def debug_enabled():
+    return os.environ.get(DEBUG_ENV, "") not in ("", "0") or st.query_params.get("debug") == "1"
+
+# Memory is only traced when debug mode is on for the whole process: tracing slows down every
+# session while it runs, so ?debug=1 alone reports wall times only
+def memory_tracing():
+    return os.environ.get(DEBUG_ENV, "") not in ("", "0")
+
+def _setup_logging():
+    if logger.handlers:
+        return
+    path = os.environ.get(LOG_PATH_ENV)
+    handler = logging.FileHandler(path) if path else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Profiles of the reruns in progress and how many were ever started. The traced memory peak
+# is process-wide, so a section that overlapped another profiled rerun gets no peak.
+_active_profiles = weakref.WeakSet()
+_profiles_started = 0
+_profiles_lock = threading.Lock()
+
+def _profiling_state():
+    with _profiles_lock:
+        return len(_active_profiles), _profiles_started
+
+# Wall time, peak traced memory and input rows of each section of one rerun. Nested sections
+# are named parent/child, and a child's memory peak is carried up to its parent.
+class RerunProfile:
+    def __init__(self, memory=False):
+        global _profiles_started
+        self.started = time.perf_counter()
+        self.memory = memory
+        self.sections = []
+        self.aggregates = []
+        self._stack = []
+        with _profiles_lock:
+            _active_profiles.add(self)
+            _profiles_started += 1
+
+    # The rerun is over; other reruns no longer overlap it
+    def close(self):
+        with _profiles_lock:
+            _active_profiles.discard(self)
+
+    @contextlib.contextmanager
+    def section(self, name, rows=None):
+        path = "/".join([frame["name"] for frame in self._stack] + [name])
+        if not self.memory:
+            started = time.perf_counter()
+            self._stack.append({"name": name})
+            try:
+                yield
+            finally:
+                self._stack.pop()
+                self.sections.append({"section": path, "seconds": round(time.perf_counter() - started, 4),
+                                      "peak_mb": None, "rows": rows})
+            return
+
+        state = _profiling_state()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+        frame = {"name": name, "start": current, "peak": current}
+        self._stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self._stack.pop()
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+            alone = state[0] == 1 and _profiling_state() == state
+            self.sections.append({"section": path, "seconds": round(seconds, 4),
+                                  "peak_mb": round((peak - frame["start"]) / 2**20, 2) if alone else None,
+                                  "rows": rows})
+
+    def record(self):
+        ctx = get_script_run_ctx()
+        return {
+            "event": "rerun",
+            "session": ctx.session_id if ctx else None,
+            "seconds": round(time.perf_counter() - self.started, 4),
+            "sections": self.sections,
+            "aggregates": {"hits": sum(service.hits for service in self.aggregates),
+                           "misses": sum(service.misses for service in self.aggregates)},
+            "store": datasets.occupancy(),
+            "figures": figures.stats(),
+        }
+
+# Start profiling this rerun when debug mode is on
+def start_rerun():
+    previous = st.session_state.pop("rerun_profile", None)
+    if previous is not None:
+        previous.close()
+    if not debug_enabled():
+        return None
+    memory = memory_tracing()
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _setup_logging()
+    profile = RerunProfile(memory)
+    st.session_state["rerun_profile"] = profile
+    return profile
+
+# Log the rerun and show its sections in the sidebar
+def finish_rerun():
+    profile = st.session_state.get("rerun_profile")
+    if profile is None:
+        return
+    profile.close()
+    record = profile.record()
+    logger.info(json.dumps(record, default=str))
+
+    with st.sidebar.expander("🛠 Profile of this rerun", expanded=True):
+        st.caption(f"Total {record['seconds']:.3f}s")
+        memo = record["aggregates"]
+        st.caption(f"Aggregations: {memo['hits']:,} answered from the rerun's memo, {memo['misses']:,} computed")
+        store = record["store"]
+        st.caption(f"Shared dataset store: {store['datasets']} datasets in {store['bytes'] / 2**20:,.1f} MB "
+                   f"of {store['budget_bytes'] / 2**20:,.0f} MB, {store['evictions']} evicted")
+        cache = record["figures"]
+        hit_rate = f"{cache['hit_rate']:.0%}" if cache["hit_rate"] is not None else "n/a"
+        st.caption(f"Shared figure cache: {cache['entries']} charts in {cache['bytes'] / 2**20:,.1f} MB "
+                   f"of {cache['max_bytes'] / 2**20:,.0f} MB, {hit_rate} hit rate "
+                   f"({cache['hits']:,} hits, {cache['misses']:,} misses), {cache['evictions']} evicted")
+        table = pd.DataFrame(record["sections"], columns=["section", "seconds", "peak_mb", "rows"])
+        st.dataframe(table.sort_values("seconds", ascending=False), hide_index=True)
+        job = st.session_state.get("report_job")
+        if job is not None and job.done():
+            stages = job.stage_seconds()
+            if not getattr(job, "profile_logged", False):
+                logger.info(json.dumps({"event": "report", "session": record["session"], "stages": stages}))
+                job.profile_logged = True
+            st.caption("Last PDF report")
+            st.dataframe(pd.DataFrame(stages, columns=["stage", "seconds"]), hide_index=True)
+
+# Aggregation services of this rerun; their memo hits and misses are logged with it
+def count_aggregates(*services):
+    profile = st.session_state.get("rerun_profile")
+    if profile is not None:
+        profile.aggregates = list({id(service): service for service in services}.values())
+
+@contextlib.contextmanager
+def section(name, rows=None):
+    profile = st.session_state.get("rerun_profile")
+    if profile is None:
+        yield
+        return
+    with profile.section(name, rows):
+        yield
+
+# Rows handed to a section: a frame's length, the cells of an aggregation service's cube,
+# or a dataset's orders
+def _input_rows(args):
+    for arg in args:
+        if isinstance(arg, pd.DataFrame):
+            return len(arg)
+        if getattr(arg, "orders", None) is not None:
+            return arg.orders
+        if getattr(arg, "cube", None) is not None:
+            return len(arg.cube)
+    return None
+
+# Profile every call of a dashboard section while debug mode is on
+def profiled(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with section(fn.__name__, _input_rows(args)):
+            return fn(*args, **kwargs)
+    return wrapper
+
+_fragment_depth = contextvars.ContextVar("fragment_depth", default=0)
+
+# A profiled section run as a fragment (st.fragment): its widgets rerun just this function with
+# the arguments of its last run. In debug mode a rerun of the fragment alone is logged as
+# its own JSON line.
+def fragment(fn):
+    section_fn = profiled(fn)
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        ctx = get_script_run_ctx()
+        # Fragments nested in the one being rerun are profiled as its sections
+        if ctx is None or not ctx.fragment_ids_this_run or _fragment_depth.get():
+            return section_fn(*args, **kwargs)
+        profile = start_rerun()
+        token = _fragment_depth.set(1)
+        try:
+            return section_fn(*args, **kwargs)
+        finally:
+            _fragment_depth.reset(token)
+            if profile is not None:
+                profile.close()
+                record = dict(profile.record(), event="fragment", fragment=fn.__name__)
+                logger.info(json.dumps(record, default=str))
+    return st.fragment(run)
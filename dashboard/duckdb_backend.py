@@ -0,0 +1,326 @@
+import logging
+import os
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from aggregates import AggregationService
+from cube import CUBE_MEASURES
+from data_loader import CACHE_VERSION, DASHBOARD_COLUMNS, DATE_COLUMNS, MEASURE_COLUMNS
+from filters import FILTER_LEVELS, hierarchy_options
+from rollups import ROLLUP_MEASURES
+from approximate import STRATA, ApproximateAggregationService, StratifiedSample, allocation
+from sampling import outliers_per_side
+
+try:
+    import duckdb
+except ImportError:  # large files are loaded into pandas without it
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+# Memory DuckDB may use before spilling to disk, e.g. "4GB"; DuckDB's own default when unset
+DUCKDB_MEMORY_LIMIT = os.environ.get("VIZOLYTIC_DUCKDB_MEMORY")
+
+# date_trunc() part of each time-series granularity
+DATE_PARTS = {"Daily": "day", "Weekly": "week", "Monthly": "month", "Quarterly": "quarter"}
+
+# Columns whose lowest and highest orders the scatter sample always keeps
+SCATTER_OUTLIER_COLUMNS = ["Sales", "Profit"]
+
+# Encodings tried in order when loading a CSV file
+CSV_ENCODINGS = ["utf-8", "latin-1"]
+
+def available():
+    return duckdb is not None
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+# Column expressions giving the same types as data_loader.prepare_types
+def _column_expr(col):
+    if col in DATE_COLUMNS:
+        return (f"COALESCE(TRY_STRPTIME({_quote(col)}, '%m/%d/%Y'), TRY_CAST({_quote(col)} AS TIMESTAMP)) "
+                f"AS {_quote(col)}")
+    if col in MEASURE_COLUMNS:
+        return f"TRY_CAST({_quote(col)} AS DOUBLE) AS {_quote(col)}"
+    return _quote(col)
+
+# Load the dashboard columns of a CSV file into a DuckDB database file, sorted by order date so
+# date ranges only touch the matching row groups, with the daily Sales/Profit rollup the time
+# series are answered from. Built under a temporary name and renamed.
+def _build_database(csv_path, db_path):
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(db_path), suffix=".duckdb.tmp")
+    os.close(fd)
+    os.remove(tmp_path)
+    try:
+        con = duckdb.connect(tmp_path, config=_config(db_path))
+        try:
+            for encoding in CSV_ENCODINGS:
+                source = (f"read_csv({_literal(csv_path)}, header=true, all_varchar=true, "
+                          f"encoding={_literal(encoding)})")
+                try:
+                    header = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+                    columns = [col for col in header if col in DASHBOARD_COLUMNS]
+                    con.execute(f"CREATE TABLE orders AS SELECT {', '.join(map(_column_expr, columns))} "
+                                f"FROM {source} ORDER BY {_quote(DATE_COLUMNS[0])}")
+                    break
+                except duckdb.InvalidInputException:
+                    if encoding == CSV_ENCODINGS[-1]:
+                        raise
+            levels = ", ".join(map(_quote, FILTER_LEVELS))
+            sums = ", ".join(f"sum({_quote(m)}) AS {_quote(m)}" for m in ROLLUP_MEASURES)
+            con.execute(f"CREATE TABLE daily AS SELECT {levels}, CAST({_quote(DATE_COLUMNS[0])} AS DATE) AS Period, "
+                        f"{sums} FROM orders GROUP BY ALL ORDER BY Period")
+        finally:
+            con.close()
+        os.replace(tmp_path, db_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _config(db_path):
+    config = {"temp_directory": db_path + ".spill"}
+    if DUCKDB_MEMORY_LIMIT:
+        config["memory_limit"] = DUCKDB_MEMORY_LIMIT
+    return config
+
+# A dataset queried in place from an embedded DuckDB database: filters, group-bys, top-N,
+# sampling, paging and exports run as queries and only their small results reach pandas
+class DuckDBDataset:
+    in_memory = False
+
+    def __init__(self, csv_path, digest, cache_dir):
+        self.digest = digest
+        self.db_path = os.path.join(cache_dir, f"{digest}-v{CACHE_VERSION}.duckdb")
+        if not os.path.exists(self.db_path):
+            _build_database(csv_path, self.db_path)
+        # Read-only, so several server processes can share the file
+        self.con = duckdb.connect(self.db_path, read_only=True, config=_config(self.db_path))
+        self.column_names = [row[0] for row in self._fetch("DESCRIBE orders")]
+        self.orders = self._fetch("SELECT count(*) FROM orders")[0][0]
+        first, last = self._fetch(f"SELECT min({_quote(DATE_COLUMNS[0])}), max({_quote(DATE_COLUMNS[0])}) FROM orders")[0]
+        self.first = pd.Timestamp(first) if first is not None else None
+        self.last = pd.Timestamp(last) if last is not None else None
+        levels = ", ".join(map(_quote, FILTER_LEVELS))
+        not_null = " AND ".join(f"{_quote(level)} IS NOT NULL" for level in FILTER_LEVELS)
+        self.hierarchy = self._frame(f"SELECT DISTINCT {levels} FROM orders WHERE {not_null}")
+        self._sample = None
+        self._sample_lock = threading.Lock()
+
+    # A cursor per query, so sessions and report threads can query at the same time
+    def _fetch(self, sql, params=()):
+        return self.con.cursor().execute(sql, list(params)).fetchall()
+
+    def _frame(self, sql, params=()):
+        return self.con.cursor().execute(sql, list(params)).df()
+
+    def prepare(self):
+        return self
+
+    def columns(self):
+        return list(self.column_names)
+
+    def date_range(self):
+        return self.first, self.last
+
+    def options(self, level, selection=None):
+        return hierarchy_options(self.hierarchy, FILTER_LEVELS, level, selection)
+
+    # WHERE clause and parameters of a selection (levels and dates, None for no date limit)
+    def where(self, levels, start=None, end=None, extra=(), date_column=DATE_COLUMNS[0]):
+        clauses, params = [], []
+        date = _quote(date_column)
+        if start is not None:
+            clauses.append(f"{date} >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append(f"{date} < ?")
+            params.append(end)
+        for level, values in (levels or {}).items():
+            if values:
+                clauses.append(f"{_quote(level)} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        clauses.extend(extra)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def aggregates(self, selection):
+        return SqlAggregationService(self, selection)
+
+    # Aggregates of the selection estimated from the dataset's stratified sample
+    def approximate(self, selection):
+        with self._sample_lock:
+            if self._sample is None:
+                self._sample = self._draw_sample()
+        return ApproximateAggregationService(self._sample, selection)
+
+    # Stratified sample drawn in one scan: each stratum's orders are kept with the probability
+    # that gives its allocated number of rows, decided by a hash of the row id
+    def _draw_sample(self):
+        strata = ", ".join(map(_quote, STRATA))
+        counts = self._frame(f"SELECT {strata}, count(*) AS N FROM orders GROUP BY ALL")
+        counts["Stratum"] = np.arange(len(counts))
+        counts["rate"] = allocation(counts["N"]) / counts["N"]
+        join = " AND ".join(f"o.{_quote(col)} IS NOT DISTINCT FROM s.{_quote(col)}" for col in STRATA)
+        cursor = self.con.cursor()
+        cursor.register("strata", counts)
+        rows = cursor.execute(f"SELECT o.*, s.Stratum FROM orders o JOIN strata s ON {join} "
+                              f"WHERE hash(o.rowid) % 1000000 < s.rate * 1000000").df()
+        cursor.unregister("strata")
+        population = pd.DataFrame({"N": counts["N"].to_numpy(),
+                                   "n": np.bincount(rows["Stratum"], minlength=len(counts))})
+        return StratifiedSample(rows, population)
+
+    # Measures per period for the selection with a date in [start, end), from the daily rollup
+    def rollup(self, selection, start, end, granularity):
+        where, params = self.where(selection.levels, start.date(), end.date(), date_column="Period")
+        sums = ", ".join(f"sum({_quote(m)}) AS {_quote(m)}" for m in ROLLUP_MEASURES)
+        frame = self._frame(f"SELECT CAST(date_trunc('{DATE_PARTS[granularity]}', Period) AS TIMESTAMP) AS Period, "
+                            f"{sums} FROM daily{where} GROUP BY 1 ORDER BY 1", params)
+        return frame.set_index("Period")
+
+    def count(self, selection):
+        where, params = self.where(selection.levels, selection.start, selection.end)
+        return self._fetch(f"SELECT count(*) FROM orders{where}", params)[0][0]
+
+    def head(self, n=5, start=None, end=None):
+        where, params = self.where({}, start, end)
+        return self._frame(f"SELECT * FROM orders{where} ORDER BY rowid LIMIT {int(n)}", params)
+
+    # One page of the selected columns, sorted in the database with missing values last
+    def page(self, selection, columns, sort_by=None, ascending=True, page=1, page_size=25):
+        where, params = self.where(selection.levels, selection.start, selection.end)
+        order = "rowid"
+        if sort_by is not None:
+            order = f"{_quote(sort_by)} {'ASC' if ascending else 'DESC'} NULLS LAST, rowid"
+        return self._frame(f"SELECT {', '.join(map(_quote, columns))} FROM orders{where} ORDER BY {order} "
+                           f"LIMIT {int(page_size)} OFFSET {int((page - 1) * page_size)}", params)
+
+    def _measured(self, selection):
+        not_null = [f"{_quote(col)} IS NOT NULL" for col in ("Sales", "Profit", "Quantity")]
+        return self.where(selection.levels, selection.start, selection.end, not_null)
+
+    # About n orders for the scatter plot and the number of orders they stand for. The orders
+    # with the lowest and highest Sales/Profit are always kept, up to OUTLIER_SHARE of n, the
+    # rest is a uniform reservoir sample of the other orders.
+    def scatter_sample(self, selection, n):
+        where, params = self._measured(selection)
+        total = self._fetch(f"SELECT count(*) FROM orders{where}", params)[0][0]
+        columns = "Sales, Profit, Quantity, Category"
+        if total <= n:
+            return self._frame(f"SELECT {columns} FROM orders{where}", params), total
+        k = outliers_per_side(n, SCATTER_OUTLIER_COLUMNS)
+        tails = " UNION ".join(f"(SELECT id FROM measured ORDER BY {_quote(col)} {direction} LIMIT {k})"
+                               for col in SCATTER_OUTLIER_COLUMNS for direction in ("ASC", "DESC"))
+        with_tails = (f"WITH measured AS (SELECT rowid AS id, {columns} FROM orders{where}), "
+                      f"tails AS ({tails}) ")
+        outliers = self._frame(f"{with_tails}SELECT {columns} FROM measured WHERE id IN (SELECT id FROM tails)", params)
+        rest = max(n - len(outliers), 0)
+        sample = self._frame(f"{with_tails}SELECT {columns} FROM (SELECT {columns} FROM measured "
+                             f"WHERE id NOT IN (SELECT id FROM tails)) "
+                             f"USING SAMPLE reservoir({rest} ROWS) REPEATABLE (0)", params)
+        return pd.concat([outliers, sample], ignore_index=True), total
+
+    # Sales/Profit counts on a bins x bins grid, laid out like sampling.density_grid
+    def scatter_density(self, selection, bins=80):
+        where, params = self._measured(selection)
+        total, x_lo, x_hi, y_lo, y_hi = self._fetch(
+            f"SELECT count(*), min(Sales), max(Sales), min(Profit), max(Profit) FROM orders{where}", params)[0]
+        counts = np.zeros((bins, bins))
+        if total:
+            x_width = (x_hi - x_lo) / bins or 1.0
+            y_width = (y_hi - y_lo) / bins or 1.0
+            cells = self._fetch(
+                f"SELECT least(floor((Sales - {x_lo}) / {x_width}), {bins - 1})::INTEGER AS i, "
+                f"least(floor((Profit - {y_lo}) / {y_width}), {bins - 1})::INTEGER AS j, count(*) "
+                f"FROM orders{where} GROUP BY i, j", params)
+            for i, j, count in cells:
+                counts[j, i] = count
+        x_edges = np.linspace(x_lo or 0.0, x_hi or 1.0, bins + 1)
+        y_edges = np.linspace(y_lo or 0.0, y_hi or 1.0, bins + 1)
+        return (x_edges[:-1] + x_edges[1:]) / 2, (y_edges[:-1] + y_edges[1:]) / 2, counts, total
+
+    # Export of the orders in [start, end): the query and a serializer writing it with COPY
+    def export(self, start, end):
+        date = _quote(DATE_COLUMNS[0])
+        sql = (f"SELECT * FROM orders WHERE {date} >= TIMESTAMP {_literal(pd.Timestamp(start))} "
+               f"AND {date} < TIMESTAMP {_literal(pd.Timestamp(end))} ORDER BY rowid")
+        return (lambda: sql), self.copy_bytes
+
+    def copy_bytes(self, sql, fmt):
+        # Dates written without a time of day, as the pandas export does
+        csv = "FORMAT csv, HEADER, TIMESTAMPFORMAT '%Y-%m-%d'"
+        options = {"CSV": csv, "CSV (gzip)": csv + ", COMPRESSION gzip",
+                   "Parquet": "FORMAT parquet, COMPRESSION zstd"}[fmt]
+        fd, path = tempfile.mkstemp(suffix=".export")
+        os.close(fd)
+        try:
+            self.con.cursor().execute(f"COPY ({sql}) TO {_literal(path)} ({options})")
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+    def memory_caption(self):
+        size = os.path.getsize(self.db_path)
+        return f"{self.orders:,} orders queried from disk with DuckDB ({size / 2**20:,.1f} MB database)"
+
+# Aggregation service answering every group-by from the database instead of a cube in memory
+class SqlAggregationService(AggregationService):
+    def __init__(self, dataset, selection):
+        super().__init__(None, selection.key)
+        self.dataset = dataset
+        self.selection = selection
+
+    def _query(self, by, measures, limit=None, order_by=None):
+        dims = [f"date_trunc('month', {_quote(DATE_COLUMNS[0])}) AS {_quote(col)}" if col == "Month"
+                else _quote(col) for col in by]
+        aggs = ["count(*) AS \"Orders\"" if m == "Orders" else f"sum({_quote(m)}) AS {_quote(m)}"
+                for m in measures]
+        not_null = [f"{_quote(col)} IS NOT NULL" for col in by if col != "Month"]
+        where, params = self.dataset.where(self.selection.levels, self.selection.start, self.selection.end,
+                                           not_null)
+        sql = f"SELECT {', '.join(dims + aggs)} FROM orders{where}"
+        if by:
+            sql += f" GROUP BY {', '.join(str(i + 1) for i in range(len(by)))}"
+            sql += f" ORDER BY {order_by or ', '.join(str(i + 1) for i in range(len(by)))}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self.dataset._frame(sql, params)
+
+    def get(self, by, measures=("Sales",)):
+        by, measures = tuple(by), tuple(measures)
+        return self._memo(("group", by, measures), lambda: self._query(by, measures))
+
+    def totals(self):
+        def compute():
+            row = self._query((), CUBE_MEASURES + ["Orders"]).iloc[0]
+            return row.fillna(0).astype(float)
+        return self._memo(("totals",), compute)
+
+    # Largest n groups, ordered and cut in the database
+    def top(self, by, n=5, measure="Sales"):
+        return self._memo(("top", by, n, measure),
+                          lambda: self._query((by,), (measure,), limit=n, order_by=f"{_quote(measure)} DESC"))
+
+# Digests with a database file in the cache directory
+def known_digests(cache_dir):
+    suffix = f"-v{CACHE_VERSION}.duckdb"
+    try:
+        return {name[:-len(suffix)] for name in os.listdir(cache_dir) if name.endswith(suffix)}
+    except FileNotFoundError:
+        return set()
+
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+# The process-wide DuckDB dataset for this digest, loading the CSV file on first use
+def open_dataset(csv_path, digest, cache_dir):
+    with _datasets_lock:
+        if digest not in _datasets:
+            _datasets[digest] = DuckDBDataset(csv_path, digest, cache_dir)
+        return _datasets[digest]
@@ -0,0 +1,56 @@
+import gzip
+import io
+import pyarrow as pa
+import pyarrow.parquet as pq
+from lru import LRUCache
+
+# Download formats: file extension and mime type
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+# Rows serialized at a time, so a large export never holds its whole CSV text in memory
+EXPORT_CHUNK_ROWS = 100_000
+
+# Bytes of finished exports kept for repeat downloads
+MAX_EXPORT_BYTES = 256 * 1024 * 1024
+
+def _write_csv(df, out):
+    for start in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS):
+        chunk = df.iloc[start:start + EXPORT_CHUNK_ROWS]
+        out.write(chunk.to_csv(index=False, header=start == 0).encode("utf-8"))
+
+def _write_parquet(df, out):
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for start in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS):
+            chunk = df.iloc[start:start + EXPORT_CHUNK_ROWS]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+# Serialize a frame in the given format, chunk by chunk
+def serialize(df, fmt):
+    buffer = io.BytesIO()
+    if fmt == "CSV":
+        _write_csv(df, buffer)
+    elif fmt == "CSV (gzip)":
+        with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=6, mtime=0) as out:
+            _write_csv(df, out)
+    elif fmt == "Parquet":
+        _write_parquet(df, buffer)
+    else:
+        raise ValueError(f"unknown export format: {fmt}")
+    return buffer.getvalue()
+
+_exports = LRUCache(max_bytes=MAX_EXPORT_BYTES)
+
+# Export bytes of build() in the given format. `key` identifies the data (dataset digest and
+# filter state); the frame is only built and serialized when that export is not cached yet.
+# Another serializer(data, fmt) can be given for data that is not a DataFrame.
+def export_bytes(build, fmt, key, serializer=serialize):
+    return _exports.get_or_compute((key, fmt), lambda: serializer(build(), fmt))
+
+# A zero-argument callable producing the export, for deferred download buttons
+def deferred_export(build, fmt, key, serializer=serialize):
+    return lambda: export_bytes(build, fmt, key, serializer)
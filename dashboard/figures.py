@@ -0,0 +1,24 @@
+import hashlib
+import json
+import os
+import sys
+import plotly.io as pio
+from lru import LRUCache
+
+# Memory the cached figure specs may take together, in MB
+FIGURE_CACHE_MB = float(os.environ.get("VIZOLYTIC_FIGURE_CACHE_MB", "64"))
+
+# Cache key of a dashboard chart: its type and a hash of what it is drawn from (dataset
+# digest, filter/date selection, approximate or exact)
+def chart_key(chart, *view):
+    return f"{chart}:{hashlib.sha1(repr(view).encode()).hexdigest()}"
+
+# Serialized Plotly figures shared by every session of the server process. A chart whose
+# key is cached skips building its figure (Plotly Express validation included) and its
+# serialization.
+figures = LRUCache(max_bytes=int(FIGURE_CACHE_MB * 2**20), sizeof=sys.getsizeof)
+
+# The figure for this key as a dict ready for st.plotly_chart; build() only runs when it
+# is not cached
+def cached_figure(key, build):
+    return json.loads(figures.get_or_compute(key, lambda: pio.to_json(build(), validate=False)))
@@ -0,0 +1,213 @@
+import copy
+import numpy as np
+import pandas as pd
+from cube import build_cube
+
+# Sidebar filter levels, from the widest to the narrowest
+FILTER_LEVELS = ["Region", "State", "City"]
+
+# Categorical codes and per-value row positions for the Region/State/City filters,
+# built once per frame so a selection never scans or copies the full frame
+class FilterIndex:
+    def __init__(self, frame, levels=FILTER_LEVELS):
+        self.levels = list(levels)
+        self.size = len(frame)
+        self.codes = {}
+        self.values = {}
+        self.postings = {}
+        self.uniques = {}
+        for level in self.levels:
+            codes, uniques = pd.factorize(frame[level], sort=True)
+            # Plain values, whatever the column's dtype, so appended values can be added
+            uniques = pd.Index(np.asarray(uniques, dtype=object))
+            codes = codes.astype(_code_type(uniques))
+            self.codes[level] = codes
+            self.values[level] = {value: i for i, value in enumerate(uniques)}
+            self.postings[level] = _postings(codes, len(uniques))
+            self.uniques[level] = uniques
+
+        # Distinct Region/State/City combinations, used for the dependent option lists
+        self.hierarchy = self._hierarchy()
+
+    # Index of the frame with rows appended at the end; existing positions and codes are kept.
+    # A new index is returned and this one is left as is, sessions may still be using it.
+    def extend(self, delta):
+        extended = copy.copy(self)
+        extended.codes, extended.values = dict(self.codes), dict(self.values)
+        extended.postings, extended.uniques = dict(self.postings), dict(self.uniques)
+        for level in self.levels:
+            values, postings, uniques = dict(self.values[level]), list(self.postings[level]), self.uniques[level]
+            new_values = [value for value in pd.unique(delta[level].dropna()) if value not in values]
+            for value in new_values:
+                values[value] = len(values)
+                postings.append(np.empty(0, dtype=np.intp))
+            if new_values:
+                uniques = uniques.append(pd.Index(new_values))
+
+            codes_type = _code_type(uniques)
+            delta_codes = uniques.get_indexer(np.asarray(delta[level], dtype=object)).astype(codes_type)
+            extended.codes[level] = np.concatenate([self.codes[level].astype(codes_type), delta_codes])
+            for code, positions in enumerate(_postings(delta_codes, len(uniques), self.size)):
+                if len(positions):
+                    postings[code] = np.concatenate([postings[code], positions])
+            extended.values[level], extended.postings[level], extended.uniques[level] = values, postings, uniques
+
+        combos = delta[self.levels].dropna()
+        extended.hierarchy = pd.concat([self.hierarchy, combos]).drop_duplicates(ignore_index=True)
+        extended.size = self.size + len(delta)
+        return extended
+
+    # Decode the distinct code combinations instead of de-duplicating the string columns
+    def _hierarchy(self):
+        key = np.zeros(self.size, dtype=np.int64)
+        for level in self.levels:
+            key = key * (len(self.uniques[level]) + 1) + self.codes[level] + 1
+        key = pd.unique(key)
+        columns = {}
+        for level in reversed(self.levels):
+            base = len(self.uniques[level]) + 1
+            key, codes = np.divmod(key, base)
+            columns[level] = codes - 1
+        valid = np.all([codes >= 0 for codes in columns.values()], axis=0)
+        return pd.DataFrame({level: self.uniques[level].take(columns[level][valid])
+                             for level in self.levels})
+
+    # Options for a level, restricted to the values selected at the levels above it
+    def options(self, level, selection=None):
+        return hierarchy_options(self.hierarchy, self.levels, level, selection)
+
+    # Sorted row positions matching the selection, None when nothing is selected
+    def positions(self, selection):
+        selected = []
+        for level in self.levels:
+            chosen = (selection or {}).get(level)
+            if chosen:
+                codes = [self.values[level][value] for value in chosen if value in self.values[level]]
+                count = sum(len(self.postings[level][code]) for code in codes)
+                selected.append((count, level, codes))
+        if not selected:
+            return None
+
+        # Start from the most selective level and narrow it down with the codes of the others
+        selected.sort(key=lambda item: item[0])
+        _, level, codes = selected[0]
+        if not codes:
+            return np.empty(0, dtype=np.intp)
+        result = np.sort(np.concatenate([self.postings[level][code] for code in codes]))
+        for _, level, codes in selected[1:]:
+            result = result[np.isin(self.codes[level][result], codes)]
+        return result
+
+
+# Values of `level` in a frame of distinct level combinations, restricted to the values
+# selected at the levels above it
+def hierarchy_options(hierarchy, levels, level, selection=None):
+    rows = hierarchy
+    for parent in levels[:levels.index(level)]:
+        chosen = (selection or {}).get(parent)
+        if chosen:
+            rows = rows[rows[parent].isin(chosen)]
+    return sorted(rows[level].unique())
+
+# Smallest signed integer type for the codes of these values (-1 marks missing values);
+# small codes also let the stable sort in _postings use radix sort
+def _code_type(uniques):
+    return np.min_scalar_type(-max(len(uniques), 1))
+
+# Row positions of each code, in ascending order, shifted by offset
+def _postings(codes, count, offset=0):
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(count + 1))
+    return [order[bounds[i]:bounds[i + 1]] + offset for i in range(count)]
+
+# Sorted dates of a frame, so a date range is a contiguous block of positions found by binary search
+class DateIndex:
+    def __init__(self, dates):
+        self.dates = dates.to_numpy()
+        valid = self.dates[~np.isnat(self.dates)]
+        self.first = pd.Timestamp(valid[0]) if len(valid) else None
+        self.last = pd.Timestamp(valid[-1]) if len(valid) else None
+
+    # Positions [lo, hi) of the dates in [start, end)
+    def bounds(self, start, end):
+        keys = np.array([np.datetime64(start), np.datetime64(end)]).astype(self.dates.dtype)
+        lo, hi = np.searchsorted(self.dates, keys)
+        return int(lo), int(hi)
+
+# Rows at the given sorted positions that fall in [lo, hi); a plain slice when nothing is selected
+def take_range(frame, positions, lo, hi):
+    if positions is None:
+        return frame.iloc[lo:hi]
+    return frame.take(positions[np.searchsorted(positions, lo):np.searchsorted(positions, hi)])
+
+def _month_start(date):
+    return date.to_period("M").to_timestamp()
+
+# Region/State/City and date filtering of a dataset and its cube. Both frames are sorted by date,
+# so the matching positions of a selection are sorted by date too and a date range is a slice of them
+class DatasetFilter:
+    def __init__(self, df, cube):
+        self.df = df
+        self.cube = cube
+        self.rows = FilterIndex(df)
+        self.row_dates = DateIndex(df["Order Date"])
+        self.cells = FilterIndex(cube)
+        self.cell_months = DateIndex(cube["Month"])
+
+    # Filter of the dataset with rows appended, carried over from this one (which is left as
+    # is): the row index is extended when the existing rows kept their positions, the small
+    # cube index is rebuilt
+    def extend(self, df, cube, append):
+        extended = copy.copy(self)
+        extended.rows = self.rows.extend(append["delta"]) if append["in_order"] else FilterIndex(df)
+        extended.df = df
+        extended.row_dates = DateIndex(df["Order Date"])
+        extended.cube = cube
+        extended.cells = FilterIndex(cube)
+        extended.cell_months = DateIndex(cube["Month"])
+        return extended
+
+    def options(self, level, selection=None):
+        return self.rows.options(level, selection)
+
+    # First and last order dates
+    def date_range(self):
+        return self.row_dates.first, self.row_dates.last
+
+    # Positions of the rows matching the selection with an order date in [start, end):
+    # a slice when only the date range applies, otherwise a sorted array
+    def row_positions(self, selection, start, end):
+        lo, hi = self.row_dates.bounds(start, end)
+        positions = self.rows.positions(selection)
+        if positions is None:
+            return slice(lo, hi)
+        return positions[np.searchsorted(positions, lo):np.searchsorted(positions, hi)]
+
+    # Order rows at positions returned by row_positions()
+    def take_rows(self, rows):
+        return self.df.iloc[rows] if isinstance(rows, slice) else self.df.take(rows)
+
+    # Order rows matching the selection with an order date in [start, end)
+    def filter_rows(self, selection, start, end):
+        return self.take_rows(self.row_positions(selection, start, end))
+
+    # Cube cells for the selection in [start, end): whole months are sliced from the cube,
+    # only partial months at the edges are aggregated from the order rows
+    def filter_cube(self, selection, start, end):
+        first_full = start if start == _month_start(start) else _month_start(start) + pd.offsets.MonthBegin()
+        last_full = _month_start(end)
+        parts = []
+        if first_full < last_full:
+            lo, hi = self.cell_months.bounds(first_full, last_full)
+            parts.append(take_range(self.cube, self.cells.positions(selection), lo, hi))
+            edges = [(start, first_full), (last_full, end)]
+        else:
+            edges = [(start, end)]
+        for edge_start, edge_end in edges:
+            if edge_start < edge_end:
+                rows = self.filter_rows(selection, edge_start, edge_end)
+                if len(rows):
+                    parts.append(build_cube(rows))
+        if not parts:
+            return self.cube.iloc[0:0]
+        return parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+from lru import LRUCache
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+# Sorted filter results kept per grid, for the sessions paging through the same dataset
+MAX_SORTED_SELECTIONS = 8
+
+# Memory the per-column sort orders and the sorted filter results of one grid may each take, in MB
+MAX_ORDERS_MB = 64
+
+# Server-side paging of a dataset: per-column sort orders are computed once per dataset, and a page
+# is cut from the filtered row positions so only that page is ever copied or styled. on_grow() is
+# called after a new order or sorted result is kept, so its owner can measure the grid again.
+class GridIndex:
+    def __init__(self, df, on_grow=None):
+        self.df = df
+        self.on_grow = on_grow
+        self.orders = LRUCache(max_bytes=MAX_ORDERS_MB * 2**20, sizeof=lambda positions: positions.nbytes)
+        self._sorted = LRUCache(max_entries=MAX_SORTED_SELECTIONS, max_bytes=MAX_ORDERS_MB * 2**20,
+                                sizeof=lambda positions: positions.nbytes)
+        # Row positions fit in 4 bytes for any dataset held in memory
+        self._dtype = np.int32 if len(df) < 2**31 else np.int64
+
+    # Keep positions in one of the caches and report the growth
+    def _keep(self, cache, key, compute):
+        positions = cache.get(key)
+        if positions is None:
+            positions = cache.put(key, compute())
+            if self.on_grow is not None:
+                self.on_grow()
+        return positions
+
+    # Row positions of the whole dataset sorted by a column, missing values last
+    def order(self, column, ascending=True):
+        def sort():
+            codes, uniques = pd.factorize(self.df[column], sort=True)
+            if not ascending:
+                codes = np.where(codes >= 0, len(uniques) - 1 - codes, codes)
+            codes = np.where(codes >= 0, codes, len(uniques))
+            return np.argsort(codes, kind="stable").astype(self._dtype)
+        return self._keep(self.orders, (column, ascending), sort)
+
+    # Filtered positions (a slice or a sorted array) in the requested order; recent results are
+    # kept per (filter, sort) so paging through the same filter and sort is O(page)
+    def _positions(self, rows, rows_key, column, ascending):
+        if column is None:
+            return rows
+        def sort():
+            order = self.order(column, ascending)
+            member = np.zeros(len(self.df), dtype=bool)
+            member[rows] = True
+            return order[member[order]]
+        return self._keep(self._sorted, (rows_key, column, ascending), sort)
+
+    # Number of rows in a slice or position array
+    @staticmethod
+    def count(rows):
+        return max(rows.stop - rows.start, 0) if isinstance(rows, slice) else len(rows)
+
+    # One page of the selected columns
+    def page(self, rows, rows_key, columns, sort_by=None, ascending=True, page=1, page_size=PAGE_SIZES[0]):
+        positions = self._positions(rows, rows_key, sort_by, ascending)
+        start = (page - 1) * page_size
+        if isinstance(positions, slice):
+            stop = min(positions.start + start + page_size, positions.stop)
+            return self.df.iloc[positions.start + start:stop][columns]
+        return self.df.take(positions[start:start + page_size])[columns]
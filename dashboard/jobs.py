@@ -0,0 +1,58 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Reports built at the same time across all sessions of the server process
+REPORT_WORKERS = 4
+
+_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report")
+
+# A background job with its latest progress; the build function receives a
+# progress(fraction, status) callback as its `progress` keyword argument
+class Job:
+    def __init__(self, build, *args):
+        self.progress = 0.0
+        self.status = "Queued"
+        self.stages = []
+        self.finished = None
+        self._lock = threading.Lock()
+        self.future = _executor.submit(self._run, build, *args)
+
+    def _run(self, build, *args):
+        self.update(0.0, "Started")
+        try:
+            return build(*args, progress=self.update)
+        except Exception:
+            logger.exception("background job failed")
+            raise
+        finally:
+            self.finished = time.perf_counter()
+
+    def update(self, fraction, status):
+        with self._lock:
+            self.progress = min(max(fraction, 0.0), 1.0)
+            if status != self.status or not self.stages:
+                self.stages.append((status, time.perf_counter()))
+            self.status = status
+
+    # (status, seconds) of each stage the job went through
+    def stage_seconds(self):
+        with self._lock:
+            ends = [started for _, started in self.stages[1:]] + [self.finished or time.perf_counter()]
+            return [(status, round(end - started, 4)) for (status, started), end in zip(self.stages, ends)]
+
+    def done(self):
+        return self.future.done()
+
+    def error(self):
+        return self.future.exception() if self.future.done() else None
+
+    def result(self):
+        return self.future.result()
+
+# Queue build(*args) on the shared worker pool and return its job handle
+def submit_job(build, *args):
+    return Job(build, *args)
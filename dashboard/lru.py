@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+# Bounded cache shared by the sessions (threads) of the server process: at most max_entries
+# values and/or values of at most max_bytes together, as measured by sizeof(value). Least
+# recently used values are dropped first; the newest value is always kept, even when it alone
+# exceeds max_bytes. Values are shared, treat them as read-only.
+class LRUCache:
+    def __init__(self, max_entries=None, max_bytes=None, sizeof=len):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._values = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._values
+
+    def __len__(self):
+        with self._lock:
+            return len(self._values)
+
+    # The value for this key, marked as recently used; `default` when it is not cached
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._values.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._values.move_to_end(key)
+            return value
+
+    # Cache value under key unless another thread cached one meanwhile; returns the cached value
+    def put(self, key, value):
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = value
+                self._sizes[key] = self.sizeof(value) if self.max_bytes is not None else 0
+                self.bytes += self._sizes[key]
+            self._values.move_to_end(key)
+            self._evict()
+            return self._values[key]
+
+    # The value for this key, computed with compute() when it is not cached. Threads missing
+    # the same key at once may each compute it; the first one cached wins.
+    def get_or_compute(self, key, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.put(key, compute())
+        return value
+
+    # Measure a cached value again after it grew or shrank in place
+    def resize(self, key):
+        with self._lock:
+            if key in self._values and self.max_bytes is not None:
+                size = self.sizeof(self._values[key])
+                self.bytes += size - self._sizes[key]
+                self._sizes[key] = size
+                self._evict()
+
+    def _evict(self):
+        while len(self._values) > 1 and (
+                (self.max_entries is not None and len(self._values) > self.max_entries)
+                or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            key, _ = self._values.popitem(last=False)
+            self.bytes -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._sizes.clear()
+            self.bytes = 0
+
+    # Values held, their bytes, the limits and the hit rate since the cache was created
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._values),
+                "bytes": self.bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,11 @@
+from lru import LRUCache
+
+# Results of sections computed on demand, kept for later reruns and other sessions
+MAX_SECTION_RESULTS = 64
+
+_results = LRUCache(max_entries=MAX_SECTION_RESULTS)
+
+# Result of compute() for this key (section, dataset digest and filter state), computed once
+# while it stays cached; treat it as read-only
+def memoized(key, compute):
+    return _results.get_or_compute(key, compute)
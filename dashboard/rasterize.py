@@ -0,0 +1,91 @@
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import plotly.io as pio
+from lru import LRUCache
+
+try:
+    import kaleido
+except ImportError:  # plotly raises its own error when an image is requested
+    kaleido = None
+
+logger = logging.getLogger(__name__)
+
+# Browser tabs kept open for rendering, one per chart of the report
+RENDER_TABS = 3
+
+# Rendered PNGs kept in memory for later reports
+MAX_CACHED_IMAGES = 64
+
+# A Kaleido browser opened once per process and reused for every report. It runs on its own
+# event loop thread so figures submitted together are rendered on separate tabs at the same time.
+class ChartRenderer:
+    def __init__(self, tabs=RENDER_TABS):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True, name="chart-renderer").start()
+        try:
+            self.kaleido = self._run(self._open(tabs))
+        except Exception:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            raise
+
+    async def _open(self, tabs):
+        renderer = kaleido.Kaleido(n=tabs)
+        await renderer.open()
+        return renderer
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def render(self, figs):
+        async def render_all():
+            return await asyncio.gather(*[self.kaleido.calc_fig(fig.to_dict(), opts=_image_opts(fig))
+                                          for fig in figs])
+        return self._run(render_all())
+
+# Fallback without a persistent browser (e.g. Kaleido 0.x): plotly's to_image on a thread pool
+class ThreadRenderer:
+    def __init__(self, workers=RENDER_TABS):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chart-renderer")
+
+    def render(self, figs):
+        return list(self.pool.map(lambda fig: pio.to_image(fig, format="png"), figs))
+
+def _image_opts(fig):
+    return dict(format="png", width=fig.layout.width or 700, height=fig.layout.height or 500, scale=1)
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+# The process-wide renderer, started on first use
+def get_renderer():
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            try:
+                _renderer = ChartRenderer() if hasattr(kaleido, "Kaleido") else ThreadRenderer()
+            except Exception as exc:
+                logger.warning("persistent chart renderer unavailable (%s), using to_image", exc)
+                _renderer = ThreadRenderer()
+        return _renderer
+
+_image_cache = LRUCache(max_entries=MAX_CACHED_IMAGES)
+
+# Cache key of a figure: its full JSON spec plus the filter state it was built for
+def image_key(fig, filter_key=None):
+    spec = fig.to_json() + repr(filter_key)
+    return hashlib.sha256(spec.encode()).hexdigest()
+
+# PNG bytes for each figure; cached images are reused and the rest are rendered concurrently
+def render_png(figs, filter_key=None):
+    keys = [image_key(fig, filter_key) for fig in figs]
+    images = {key: png for key in keys if (png := _image_cache.get(key)) is not None}
+
+    missing = [(key, fig) for key, fig in zip(keys, figs) if key not in images]
+    if missing:
+        rendered = get_renderer().render([fig for _, fig in missing])
+        for (key, _), png in zip(missing, rendered):
+            images[key] = _image_cache.put(key, png)
+    return [images[key] for key in keys]
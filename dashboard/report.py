@@ -0,0 +1,225 @@
+import io
+from itertools import zip_longest
+import plotly.express as px
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.pagesizes import letter
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.pdfgen import canvas
+from rasterize import render_png
+
+# PDF report header
+def report_header(story, styles):
+    icon = Image("assets/icon1.png", width=50, height=50)
+    title = Paragraph("<b>Vizolytic – Sales Dashboard Report</b>", styles["Title"])
+
+    # Create a small table to align icon and title horizontally and tightly
+    table = Table(
+        [[icon, title]],
+        colWidths=[10, 400],  # Adjust width as needed
+        hAlign='CENTER'
+    )
+
+    # Add style to reduce space between icon and title
+    table.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ('TOPPADDING', (0, 0), (-1, -1), 0),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+    ]))
+
+    story.append(table)
+    story.append(Spacer(1, 10))
+
+def add_footer(c: canvas.Canvas, doc):
+    width, height = letter
+    footer_text = "Created by Vizolytic"
+    c.setFont("Helvetica-Oblique", 9)
+    c.setFillColor(colors.grey)
+    c.drawCentredString(width / 2.0, 15, footer_text)
+
+# Build the PDF report for the aggregates of the current filters and return its bytes.
+# progress(fraction, status) is called as the report is put together.
+def build_report(aggregates, progress=lambda fraction, status: None):
+    # Create a BytesIO buffer for the PDF
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    styles = getSampleStyleSheet()
+    story = []
+
+    # Report Title 
+    report_header(story, styles)
+
+    # --- Summary Section ---
+    progress(0.1, "Summarizing")
+    category_df = aggregates.get(["Category"])
+    totals = aggregates.totals()
+    total_sales = totals["Sales"]
+    tolal_profit = totals["Profit"]
+    percent_profit = (tolal_profit/(total_sales-tolal_profit) * 100)
+    total_orders = int(totals["Orders"])
+
+    summary_text = f"""
+    <b>Total Sales:</b> ${total_sales:,.2f}<br/>
+    <b>Total Profit:</b> ${tolal_profit:,.2f} ({percent_profit:,.2f}%)<br/>
+    <b>Total Orders:</b> {total_orders}<br/>
+    """
+    story.append(Paragraph(summary_text, styles["BodyText"]))
+    story.append(Spacer(1, 10))
+
+    # --- Plotly Bar Chart (same color & format as dashboard) ---
+    fig_bar = px.bar(
+        category_df,
+        x="Category",
+        y="Sales",
+        text=[f"${x:,.2f}" for x in category_df["Sales"]],
+        template="seaborn",
+        color="Category",
+        color_discrete_sequence=["#4c72b0"]
+    )
+    fig_bar.update_layout(
+        title="Category Wise Sales",
+        xaxis_title="Category",
+        yaxis_title="Sales",
+        height=400,
+        width=600,
+        font=dict(size=12),
+        showlegend=False
+    )
+
+    # --- Plotly Pie Chart (same color & format) ---
+    region_sales = aggregates.get(["Region"])
+    # Define custom color map
+    region_colors = {
+        "West": "#0d63c7",    # Dark Blue
+        "East": "#73bdf1",    # Light Blue
+        "Central": "#f04747", # Red
+        "South": "#f7b6b2"    # Light Pink
+    }
+
+    # Create pie chart with color map
+    fig_pie = px.pie(
+        region_sales,
+        values="Sales",
+        names="Region",
+        hole=0,
+        color="Region",
+        color_discrete_map=region_colors,
+    )
+
+    fig_pie.update_traces(
+        textposition="outside",
+        textinfo="label+percent",
+        textfont_size=12
+    )
+
+    fig_pie.update_layout(
+        title="Region Wise Sales",
+        height=400,
+        width=600,
+        font=dict(size=12),
+        legend_title_text="Region"
+    )
+
+    # --- U.S. Sales Heatmap ---
+    state_sales = aggregates.state_sales()
+
+    fig_map = px.choropleth(
+        state_sales,
+        locations="State_Abbrev",
+        locationmode="USA-states",
+        color="Sales",
+        hover_name="State",
+        hover_data={"Sales": True, "State_Abbrev": False},
+        color_continuous_scale="Blues",
+        range_color=(0, state_sales["Sales"].max()),
+        scope="usa",
+        labels={"Sales": "Total Sales"}
+    )
+
+    fig_map.update_layout(
+        template='plotly_white',
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        margin=dict(l=0, r=0, t=30, b=0),
+        height=500,
+        width=900,
+        title=dict(
+            text="State-wise Sales in the U.S.",
+            font=dict(size=20, color="#333"),
+            x=0.5  # center the title
+        )
+    )
+
+    progress(0.3, "Rendering charts")
+
+    # --- Render the three charts concurrently (cached per figure and filter state) ---
+    bar_png, pie_png, map_png = render_png([fig_bar, fig_pie, fig_map], aggregates.filter_key)
+
+    # --- Add to PDF Story ---
+    story.append(Image(io.BytesIO(bar_png), width=400, height=250))
+    story.append(Spacer(1, 10))
+    story.append(Image(io.BytesIO(pie_png), width=380, height=250))
+    story.append(Spacer(1, 10))
+    story.append(Image(io.BytesIO(map_png), width=500, height=300))
+    story.append(Spacer(1, 25))
+
+    progress(0.8, "Building tables")
+
+    # --- Top 5 States and Top 5 Cities Table ---
+    top_states = aggregates.top("State")
+    top_cities = aggregates.top("City")
+
+    # Create a centered style based on Heading3
+    centered_heading = ParagraphStyle(
+        name="CenteredHeading",
+        parent=styles["Heading3"],
+        alignment=TA_CENTER
+    )
+
+    # Table title (centered)
+    story.append(Paragraph("<b>Top 5 States and Top 5 Cities by Sales</b>", centered_heading))
+    story.append(Spacer(1, 5))
+
+    # Prepare table data with headers
+    table_data = [["Top 5 States", "Sales", "Top 5 Cities", "Sales"]]
+
+    # Fill table rows (use zip_longest to handle uneven lengths)
+    for state_row, city_row in zip_longest(top_states.itertuples(), top_cities.itertuples(), fillvalue=None):
+        state_name = state_row.State if state_row else ""
+        state_sales = f"${state_row.Sales:,.2f}" if state_row else ""
+        city_name = city_row.City if city_row else ""
+        city_sales = f"${city_row.Sales:,.2f}" if city_row else ""
+        table_data.append([state_name, state_sales, city_name, city_sales])
+
+    # Create ReportLab Table
+    tbl = Table(table_data, colWidths=[100, 80, 100, 80])
+    tbl.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.grey),       # Header background
+        ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),  # Header text color
+        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0,0), (-1,0), 8),
+
+        # Alternate column colors: State columns beige, City columns light blue
+        ('BACKGROUND', (0,1), (1,-1), colors.beige),
+        ('BACKGROUND', (2,1), (3,-1), colors.lightblue),
+
+        ('GRID', (0,0), (-1,-1), 1, colors.black),
+    ]))
+
+    story.append(tbl)
+    story.append(Spacer(1, 10))
+
+    # --- Build PDF ---
+    progress(0.9, "Building PDF")
+    doc.build(
+        story,
+        onFirstPage=add_footer,
+        onLaterPages=add_footer
+    )
+    progress(1.0, "Done")
+    return buffer.getvalue()
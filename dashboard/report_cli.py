@@ -0,0 +1,113 @@
+"""Generate one PDF report per Region and/or State without the Streamlit app.
+
+Run from the repository root, e.g.:
+
+    python dashboard/report_cli.py --by region state --output reports
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from data_loader import DEFAULT_DATASET, read_disk_cache, read_path
+from cube import build_cube
+from filters import DatasetFilter
+from aggregates import AggregationService
+from report import build_report
+
+LEVELS = {"region": "Region", "state": "State", "city": "City"}
+
+# Dataset, cube and filter indexes of a worker process, loaded once per worker
+_worker = {}
+
+# Worker start-up: memory-map the dataset the parent process already ingested
+def _init_worker(path, digest):
+    df = read_disk_cache(digest)
+    if df is None:
+        df, _ = read_path(path)
+    _worker["filter"] = DatasetFilter(df, build_cube(df))
+
+# Build and write one report, returning its summary entry
+def _render(level, value, start, end, output):
+    started = time.perf_counter()
+    selection = {level: [value]}
+    filtered_cube = _worker["filter"].filter_cube(selection, start, end)
+    aggregates = AggregationService(filtered_cube, ((level, value), start, end))
+    totals = aggregates.totals()
+
+    # The report is built before anything is written, and renamed into place once complete,
+    # so a failed report leaves no empty or partial PDF behind
+    pdf = build_report(aggregates)
+    path = os.path.join(output, f"{level.lower()}-{_slug(value)}.pdf")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pdf)
+    os.replace(tmp_path, path)
+    return {
+        "level": level,
+        "value": value,
+        "file": path,
+        "orders": int(totals["Orders"]),
+        "sales": round(float(totals["Sales"]), 2),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+def _slug(value):
+    return re.sub(r"[^A-Za-z0-9]+", "_", str(value)).strip("_")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Vizolytic PDF reports in batch.")
+    parser.add_argument("--data", default=DEFAULT_DATASET, help="CSV/TXT/XLSX dataset to report on")
+    parser.add_argument("--by", nargs="+", choices=sorted(LEVELS), default=["region", "state"],
+                        help="one report per value of each of these levels")
+    parser.add_argument("--output", default="reports", help="directory the PDFs are written to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--start", help="first order date (YYYY-MM-DD), defaults to the first order")
+    parser.add_argument("--end", help="last order date (YYYY-MM-DD), defaults to the last order")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.perf_counter()
+    os.makedirs(args.output, exist_ok=True)
+
+    # Ingest once; the workers memory-map the cached copy instead of parsing again
+    df, digest = read_path(args.data)
+    dataset_filter = DatasetFilter(df, build_cube(df))
+    first, last = dataset_filter.date_range()
+    start = pd.Timestamp(args.start) if args.start else first
+    end = (pd.Timestamp(args.end) if args.end else last) + pd.Timedelta(days=1)
+
+    tasks = [(LEVELS[name], value) for name in args.by for value in dataset_filter.options(LEVELS[name])]
+    reports, failures = [], []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.data, digest)) as pool:
+        futures = {pool.submit(_render, level, value, start, end, args.output): (level, value)
+                   for level, value in tasks}
+        for future in as_completed(futures):
+            level, value = futures[future]
+            try:
+                reports.append(future.result())
+                print(f"{level} {value}: {reports[-1]['file']}")
+            except Exception as exc:
+                failures.append({"level": level, "value": value, "error": str(exc)})
+                print(f"{level} {value}: failed ({exc})", file=sys.stderr)
+
+    summary = {
+        "data": args.data,
+        "start": str(start.date()),
+        "end": str((end - pd.Timedelta(days=1)).date()),
+        "reports": sorted(reports, key=lambda r: (r["level"], r["value"])),
+        "failures": failures,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    with open(os.path.join(args.output, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    print(f"{len(reports)} reports written to {args.output} in {summary['seconds']}s, {len(failures)} failed")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import copy
+import numpy as np
+import pandas as pd
+from filters import FILTER_LEVELS, FilterIndex, DateIndex, take_range
+from schema import concat_frames
+
+# Time-series granularities and their period frequencies; weeks run Monday to Sunday
+GRANULARITIES = {"Daily": "D", "Weekly": "W", "Monthly": "M", "Quarterly": "Q"}
+
+# Periods between a period and the same period a year earlier; days are compared with the
+# same weekday of the previous year
+YEAR_LAGS = {"Daily": 364, "Weekly": 52, "Monthly": 12, "Quarterly": 4}
+
+ROLLUP_MEASURES = ["Sales", "Profit"]
+
+# First day of the period each date falls in
+def period_start(dates, freq):
+    return dates.dt.to_period(freq).dt.start_time
+
+def _floor(date, freq):
+    return pd.Period(date, freq).start_time
+
+def _ceil(date, freq):
+    floor = _floor(date, freq)
+    return floor if floor == date else (pd.Period(date, freq) + 1).start_time
+
+# Measures summed per Region/State/City and period, sorted by period
+def _rollup(frame, date_column, freq):
+    period = period_start(frame[date_column], freq).rename("Period")
+    keys = [frame[level] for level in FILTER_LEVELS] + [period]
+    measures = frame[ROLLUP_MEASURES].astype(np.float64)
+    grouped = measures.groupby(keys, dropna=False, sort=False, observed=True)
+    return grouped.sum().reset_index().sort_values("Period", kind="stable", ignore_index=True)
+
+# Daily, weekly, monthly and quarterly Sales/Profit rollups of a dataset, built once per dataset
+# (the coarser ones from the daily one) and indexed like the cube, so a time series for any
+# selection and granularity is sliced from them without touching the order rows
+class TimeRollups:
+    def __init__(self, df):
+        self._index(_rollup(df, "Order Date", "D"))
+
+    def _index(self, daily):
+        self.tables = {}
+        for name, freq in GRANULARITIES.items():
+            table = daily if freq == "D" else _rollup(daily, "Period", freq)
+            self.tables[name] = (table, FilterIndex(table), DateIndex(table["Period"]))
+
+    # Rollups of the dataset with rows appended, carried over from these (which are left as
+    # is): only the delta is rolled up and merged into the daily cells, the coarser rollups
+    # are rebuilt from those
+    def extend(self, append):
+        daily = self.tables["Daily"][0]
+        combined = concat_frames([daily, _rollup(append["delta"], "Order Date", "D")], ignore_index=True)
+        extended = copy.copy(self)
+        extended._index(_rollup(combined, "Period", "D"))
+        return extended
+
+    def _take(self, granularity, selection, start, end):
+        table, cells, periods = self.tables[granularity]
+        lo, hi = periods.bounds(start, end)
+        return take_range(table, cells.positions(selection), lo, hi)
+
+    # Measures per period for the selection with a date in [start, end) (whole days): whole
+    # periods come from the rollup of that granularity, partial ones at the edges from the daily one
+    def slice(self, selection, start, end, granularity):
+        if start >= end:
+            return pd.DataFrame(columns=ROLLUP_MEASURES, dtype=np.float64, index=pd.DatetimeIndex([], name="Period"))
+        freq = GRANULARITIES[granularity]
+        first_full, last_full = _ceil(start, freq), _floor(end, freq)
+        parts = []
+        if first_full < last_full:
+            parts.append(self._take(granularity, selection, first_full, last_full))
+            edges = [(start, first_full), (last_full, end)]
+        else:
+            edges = [(start, end)]
+        for edge_start, edge_end in edges:
+            if edge_start < edge_end:
+                daily = self._take("Daily", selection, edge_start, edge_end)
+                parts.append(daily.assign(Period=period_start(daily["Period"], freq)))
+        frame = pd.concat(parts, ignore_index=True)
+        return frame.groupby("Period")[ROLLUP_MEASURES].sum()
+
+# Sales and Profit per period for [start, end) with, per measure, its moving average over
+# `window` periods and its value and change against a year earlier. rollup(start, end, granularity)
+# gives the measures per period; the periods before `start` the windows need are fetched with it,
+# periods without orders count as zero, and everything is computed column-wise on the periods.
+def time_series(rollup, start, end, granularity, window=None):
+    freq = GRANULARITIES[granularity]
+    lag = YEAR_LAGS[granularity]
+    first = pd.Period(start, freq)
+    last = pd.Period(end - pd.Timedelta(days=1), freq)
+    history_first = first - max(lag, (window or 1) - 1)
+
+    parts = [rollup(history_first.start_time, first.start_time, granularity), rollup(start, end, granularity)]
+    periods = pd.period_range(history_first, last, freq=freq).start_time
+    series = pd.concat(parts).groupby(level=0).sum().reindex(periods, fill_value=0.0)
+    series.index.name = "Period"
+
+    result = series.copy()
+    for measure in ROLLUP_MEASURES:
+        if window:
+            result[f"{measure} moving average"] = series[measure].rolling(window, min_periods=1).mean()
+        previous = series[measure].shift(lag)
+        result[f"{measure} a year earlier"] = previous
+        result[f"{measure} YoY %"] = ((series[measure] - previous) / previous.abs() * 100).replace([np.inf, -np.inf], np.nan)
+    return result.loc[first.start_time:]
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+# Share of a sample kept for the extremes of the outlier columns, the rest samples the body
+OUTLIER_SHARE = 0.1
+
+# Rows kept per column and side (lowest and highest) for the extremes of a sample of n rows
+def outliers_per_side(n, outlier_columns, outlier_share=OUTLIER_SHARE):
+    return int(n * outlier_share) // (2 * len(outlier_columns)) if outlier_columns else 0
+
+# Random sample of about n rows, drawn proportionally from each group of `by`. The rows with
+# the lowest and highest values of each outlier column are always kept, up to outlier_share of n.
+def stratified_sample(df, n, by, outlier_columns=(), outlier_share=OUTLIER_SHARE, random_state=0):
+    if len(df) <= n:
+        return df
+
+    keep = np.zeros(len(df), dtype=bool)
+    k = outliers_per_side(n, outlier_columns, outlier_share)
+    for col in outlier_columns:
+        values = df[col].to_numpy(dtype=float)
+        valid = np.flatnonzero(~np.isnan(values))
+        if len(valid) <= 2 * k:
+            keep[valid] = True
+        elif k:
+            keep[valid[np.argpartition(values[valid], k)[:k]]] = True
+            keep[valid[np.argpartition(values[valid], -k)[-k:]]] = True
+
+    rest = df[~keep]
+    fraction = min(max(n - int(keep.sum()), 0) / max(len(rest), 1), 1.0)
+    sample = rest.groupby(by, observed=True, dropna=False, group_keys=False).sample(
+        frac=fraction, random_state=random_state)
+    return pd.concat([df[keep], sample])
+
+# Counts of x/y points on a bins x bins grid, returned as bin centers and a count matrix
+def density_grid(x, y, bins=80):
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    # histogram2d puts x along the rows, heatmaps expect y along the rows
+    return x_centers, y_centers, counts.T
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Repeated string columns held as categoricals
+CATEGORICAL_COLUMNS = ["Region", "State", "City", "Category", "Sub-Category", "Segment"]
+
+# Measures narrowed to a smaller numeric type when every value survives the conversion
+DOWNCAST_COLUMNS = ["Sales", "Profit", "Quantity"]
+
+# Largest change a float measure may see from float64 to float32, below a cent
+MEASURE_TOLERANCE = 0.005
+
+# Copy of a typed frame with its repeated string columns as categoricals
+def categorize(df):
+    columns = {col: df[col].astype("category") for col in CATEGORICAL_COLUMNS
+               if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype)}
+    return df.assign(**columns) if columns else df
+
+# Compact copy of a whole typed frame: categorical dimensions and downcast measures. The
+# measure types depend on all their values, so a frame read in chunks is compacted once
+# the chunks are put together.
+def compact(df):
+    df = categorize(df)
+    columns = {}
+    for col in DOWNCAST_COLUMNS:
+        if col in df.columns:
+            columns[col] = _downcast(df[col])
+    return df.assign(**columns) if columns else df
+
+def _downcast(values):
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return pd.to_numeric(values, downcast="integer")
+    if values.dtype != np.float64:
+        return values
+    # Whole numbers without missing values (e.g. Quantity) as the smallest integer type; with
+    # missing values they stay floats, float32 holds whole numbers exactly up to 2**24
+    finite = values.dropna()
+    if len(finite) == len(values) and np.array_equal(finite, finite.round()):
+        return pd.to_numeric(values, downcast="integer")
+    narrow = values.astype(np.float32)
+    error = np.abs(narrow.to_numpy(dtype=np.float64) - values.to_numpy())
+    if np.nanmax(error, initial=0.0) <= MEASURE_TOLERANCE:
+        return narrow
+    return values
+
+# Concatenate compact frames; categoricals are given the union of their categories so
+# they stay categorical instead of falling back to strings
+def concat_frames(frames, **kwargs):
+    frames = [frame for frame in frames if frame is not None]
+    if len(frames) > 1:
+        for col in frames[0].columns:
+            if all(isinstance(frame[col].dtype, pd.CategoricalDtype) for frame in frames if col in frame):
+                categories = union_categoricals([frame[col] for frame in frames if col in frame],
+                                                sort_categories=True).categories
+                frames = [frame.assign(**{col: frame[col].cat.set_categories(categories)})
+                          if col in frame else frame for frame in frames]
+    return pd.concat(frames, **kwargs)
+
+# Bytes held by a frame's columns, including the strings they point to
+def memory_bytes(df):
+    return int(df.memory_usage(index=False, deep=True).sum())
@@ -0,0 +1,142 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from lru import LRUCache
+
+# Memory the shared datasets and the structures built from them may take together, in MB
+STORE_BUDGET_MB = float(os.environ.get("VIZOLYTIC_STORE_MB", "2048"))
+
+# Bytes held by a dataset and everything reachable from its derived structures. Objects
+# reached twice (a filter pointing at the dataset it indexes) are counted once.
+def deep_bytes(obj, seen=None):
+    seen = set() if seen is None else seen
+    if obj is None or id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=False, deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(index=False, deep=True))
+    if isinstance(obj, pd.Index):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sum(deep_bytes(value, seen) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(deep_bytes(value, seen) for value in obj)
+    if hasattr(obj, "__dict__"):
+        return deep_bytes(vars(obj), seen)
+    return 0
+
+# A dataset in the store with the structures built from it (cube, indexes...). `append`
+# describes how it was produced from another dataset, so those can be carried forward.
+class StoreEntry:
+    def __init__(self, df, append=None):
+        self.df = df
+        self.append = append
+        self.derived = {}
+        self.measure()
+
+    def measure(self):
+        self.bytes = deep_bytes([self.df, self.append, self.derived])
+
+# Parsed datasets shared by every session of the server process, keyed by content digest so
+# identical files are held once. Sessions only keep digests; with pandas copy-on-write a
+# session cannot change a shared frame in place. Least recently used datasets are dropped
+# when the budget is exceeded and read again from the disk cache when next needed.
+class DatasetStore:
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._entries = LRUCache(max_bytes=budget_bytes, sizeof=lambda entry: entry.bytes)
+        self._lock = threading.Lock()
+        self._building = {}
+
+    def __contains__(self, digest):
+        return digest in self._entries
+
+    # The dataset for this digest, None when it is not in the store
+    def get(self, digest):
+        entry = self._entries.get(digest)
+        return entry.df if entry is not None else None
+
+    def put(self, digest, df, append=None):
+        entry = self._entries.get(digest)
+        if entry is None:
+            entry = self._entries.put(digest, StoreEntry(df, append))
+        return entry.df
+
+    # Run build() once per key, sessions asking for the same key meanwhile wait for it
+    def _once(self, key, find, build):
+        value = find()
+        if value is not None:
+            return value
+        with self._lock:
+            lock = self._building.setdefault(key, threading.Lock())
+        try:
+            with lock:
+                value = find()
+                if value is None:
+                    value = build()
+            return value
+        finally:
+            with self._lock:
+                self._building.pop(key, None)
+
+    # The dataset for this digest, loading it with load() when it is not in the store. A load
+    # returning None (nothing to load) is not stored, the next call tries again.
+    def load(self, digest, load):
+        def build():
+            df = load()
+            return self.put(digest, df) if df is not None else None
+        return self._once(digest, lambda: self.get(digest), build)
+
+    # A structure built from the dataset `digest`, shared like the dataset. When the dataset
+    # was produced by appending rows to another one, update(previous, append) carries the
+    # previous dataset's structure forward instead of building it again. update() must return
+    # a new structure: the previous one stays with its dataset, other sessions may use it.
+    def derived(self, digest, name, build, update=None):
+        def find():
+            entry = self._entries.get(digest)
+            return entry.derived.get(name) if entry is not None else None
+
+        def produce():
+            entry = self._entries.get(digest)
+            previous = self._entries.get(entry.append["digest"]) if entry is not None and entry.append else None
+            carried = previous.derived.get(name) if previous is not None else None
+            value = update(carried, entry.append) if update is not None and carried is not None else build()
+            if entry is not None:
+                entry.derived[name] = value
+                entry.measure()
+                self._entries.resize(digest)
+            return value
+        return self._once((digest, name), find, produce)
+
+    # Measure the dataset `digest` again after one of its derived structures grew in place
+    def remeasure(self, digest):
+        entry = self._entries.get(digest)
+        if entry is not None:
+            entry.measure()
+            self._entries.resize(digest)
+
+    # Append metadata of the dataset `digest`, None when it was loaded from a file
+    def append_of(self, digest):
+        entry = self._entries.get(digest)
+        return entry.append if entry is not None else None
+
+    def clear(self):
+        self._entries.clear()
+
+    # Datasets held, their bytes and the budget
+    def occupancy(self):
+        stats = self._entries.stats()
+        return {
+            "datasets": stats["entries"],
+            "bytes": stats["bytes"],
+            "budget_bytes": self.budget_bytes,
+            "evictions": stats["evictions"],
+        }
+
+# The store of this server process
+datasets = DatasetStore(int(STORE_BUDGET_MB * 2**20))
@@ -0,0 +1,117 @@
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "dashboard"))
+
+import data_loader
+from backends import PandasDataset, Selection
+from data_loader import CSV_ENCODING, append_dataset, ingest
+from rollups import GRANULARITIES
+from store import datasets
+
+SUPERSTORE = os.path.join(ROOT, "data", "Superstore.csv")
+
+SELECTIONS = [
+    {"Region": [], "State": [], "City": []},
+    {"Region": ["West"], "State": [], "City": []},
+    {"Region": ["East"], "State": ["New York"], "City": ["New York City"]},
+]
+
+GROUP_BYS = [["Category"], ["Region", "Category", "Sub-Category"], ["Sub-Category", "Month"]]
+
+PAGE_COLUMNS = ["Order Date", "City", "Sub-Category", "Sales", "Profit"]
+
+# The bundled orders as CSV text, in Order Date order
+@pytest.fixture(scope="module")
+def orders():
+    raw = pd.read_csv(SUPERSTORE, encoding=CSV_ENCODING, dtype=str)
+    dates = pd.to_datetime(raw["Order Date"])
+    return raw.iloc[np.argsort(dates.to_numpy(), kind="stable")].reset_index(drop=True)
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_loader, "CACHE_DIR", str(tmp_path))
+    datasets.clear()
+    yield datasets
+    datasets.clear()
+
+# Ingest some of the orders as if they were read from their own file
+def _ingest(rows):
+    return ingest(io.BytesIO(rows.to_csv(index=False).encode(CSV_ENCODING)))
+
+# The orders split into a base and two deltas: consecutive date ranges, or drawn at random so
+# the deltas have orders older than the rows before them
+def _parts(orders, in_order):
+    if in_order:
+        first, second = int(len(orders) * 0.6), int(len(orders) * 0.8)
+        return [orders.iloc[:first], orders.iloc[first:second], orders.iloc[second:]]
+    part = np.random.default_rng(0).integers(0, 3, len(orders))
+    return [orders[part == i] for i in range(3)]
+
+def _dataset(df, digest):
+    datasets.put(digest, df)
+    return PandasDataset(datasets.get(digest), digest).prepare()
+
+# A frame in a canonical row order with plain dtypes, so equal contents compare equal
+def _canonical(frame):
+    frame = frame.reset_index()
+    frame = frame.astype({col: object for col in frame.columns if isinstance(frame[col].dtype, pd.CategoricalDtype)})
+    keys = [col for col in frame.columns if not pd.api.types.is_float_dtype(frame[col].dtype)]
+    return frame.sort_values(keys, kind="stable", ignore_index=True)
+
+def _assert_same_answers(dataset, expected):
+    assert dataset.orders == expected.orders
+    assert dataset.date_range() == expected.date_range()
+    start, end = expected.date_range()
+    ranges = [(start, end + pd.Timedelta(days=1)), (start + pd.Timedelta(days=200), end - pd.Timedelta(days=100))]
+    for levels in SELECTIONS:
+        for level in ("State", "City"):
+            assert dataset.options(level, levels) == expected.options(level, levels)
+        for first, stop in ranges:
+            selection = Selection(levels, first, stop)
+            assert dataset.count(selection) == expected.count(selection)
+            got, want = dataset.aggregates(selection), expected.aggregates(selection)
+            for by in GROUP_BYS:
+                assert_frame_equal(_canonical(got.get(by, ["Sales", "Orders"])),
+                                   _canonical(want.get(by, ["Sales", "Orders"])), check_dtype=False)
+            for name, value in want.totals().items():
+                assert got.totals()[name] == pytest.approx(value)
+            for granularity in GRANULARITIES:
+                assert_frame_equal(dataset.rollup(selection, first, stop, granularity),
+                                   expected.rollup(selection, first, stop, granularity), check_dtype=False)
+            for sort_by, ascending, page in [(None, True, 1), ("Sales", False, 2), ("City", True, 3)]:
+                assert_frame_equal(_canonical(dataset.page(selection, PAGE_COLUMNS, sort_by, ascending, page)),
+                                   _canonical(expected.page(selection, PAGE_COLUMNS, sort_by, ascending, page)))
+
+# Datasets with orders appended answer like the same orders loaded at once, whether the cube,
+# filter indexes and rollups were carried forward (in order) or partly rebuilt (out of order)
+@pytest.mark.parametrize("in_order", [True, False], ids=["in_order", "out_of_order"])
+def test_appended_dataset_matches_fresh_load(orders, in_order):
+    base, *deltas = _parts(orders, in_order)
+    digest = "base"
+    dataset = _dataset(_ingest(base), digest)
+    for i, delta in enumerate(deltas):
+        digest = append_dataset(digest, _ingest(delta), f"delta-{i}")
+        assert datasets.append_of(digest)["in_order"] == in_order
+        dataset = PandasDataset(datasets.get(digest), digest).prepare()
+
+    fresh = _dataset(_ingest(pd.concat([base, *deltas])), "fresh")
+    assert_frame_equal(_canonical(dataset.df), _canonical(fresh.df), check_dtype=False)
+    _assert_same_answers(dataset, fresh)
+
+# Carrying structures forward leaves the previous dataset's ones as they were
+@pytest.mark.parametrize("in_order", [True, False], ids=["in_order", "out_of_order"])
+def test_append_leaves_previous_dataset_unchanged(orders, in_order):
+    base, delta, _ = _parts(orders, in_order)
+    previous = _dataset(_ingest(base), "base")
+    digest = append_dataset("base", _ingest(delta), "delta")
+    PandasDataset(datasets.get(digest), digest).prepare()
+    _assert_same_answers(PandasDataset(datasets.get("base"), "base").prepare(), _dataset(_ingest(base), "again"))
+    assert datasets.get("base") is previous.df